@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+    pidsim.bench
+    ~~~~~~~~~~~~
+    
+    Benchmark suite of pidsim.
+    
+    This package times the hot paths of pidsim (the numerical methods,
+    the polynomial and transfer function arithmetic, and the
+    identification and tuning of reaction curves) for a range of problem
+    sizes, and reports the results as a JSON document, to track
+    performance regressions between releases. Run it with::
+    
+        $ python -m pidsim.bench > results.json
+    
+    or from Python::
+    
+        >>> from pidsim.bench import run
+        >>> results = run(['polynomial'])
+        >>> results['results'][0]
+        (returns a dict with the suite, name, params and timing)
+    
+    Each timing is the best, over 'repeat' runs, of the mean time of a
+    call, in seconds. Fast calls are repeated in a loop until each run
+    takes at least 'min_time' seconds, to reduce the timer resolution
+    error.
+    
+    :copyright: 2009-2010 by Rafael Goncalves Martins
+    :license: GPL-2, see LICENSE for more details.
+"""
+
+__all__ = ['suites', 'run', 'timeit']
+
+import platform
+import sys
+import timeit as _timeit
+
+import pidsim.core
+from pidsim.core import discretization
+from pidsim.core.error import ControlSystemsError
+from pidsim.core.pid import identification, tuning
+from pidsim.core.types import Polynomial, TransferFunction
+
+min_time = 0.02
+
+
+def timeit(func, repeat=3):
+    """Timing of a function
+    
+    Returns the tuple (seconds, number), where 'seconds' is the best mean
+    time of a call of 'func' (without arguments) over 'repeat' runs of
+    'number' calls.
+    
+    """
+    
+    timer = _timeit.default_timer
+    
+    # calibrate the number of calls of each run
+    number = 1
+    while True:
+        start = timer()
+        for i in xrange(number):
+            func()
+        elapsed = timer() - start
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 10
+    
+    best = elapsed
+    for i in xrange(repeat - 1):
+        start = timer()
+        for j in xrange(number):
+            func()
+        best = min(best, timer() - start)
+    
+    return best / number, number
+
+
+def _plant(order):
+    """Returns the plant 1/(s + 1)^order"""
+    
+    den = Polynomial([1])
+    for i in range(order):
+        den = den * Polynomial([1, 1])
+    return TransferFunction([1], den)
+
+
+def _poly(size, seed):
+    """Returns a deterministic polynomial with 'size' coefficients"""
+    
+    return Polynomial([((seed + i * 7) % 13) - 6.0 for i in range(size)])
+
+
+def bench_discretization(repeat=3, orders=(1, 2, 4, 8),
+                         samples=(1000, 10000),
+                         methods=('Euler', 'RungeKutta2', 'RungeKutta3',
+                                  'RungeKutta4', 'ZOH')):
+    """Numerical methods
+    
+    Times the step response of the plant 1/(s + 1)^order with each
+    method, including the compilation of the operators (the caches are
+    cleared before each call).
+    
+    """
+    
+    for method in methods:
+        func = getattr(discretization, method)
+        for order in orders:
+            g = _plant(order)
+            for count in samples:
+                def call():
+                    discretization.cache_clear()
+                    func(g, 0.01, 0.01 * count)
+                seconds, number = timeit(call, repeat)
+                yield method, {'order': order, 'samples': count}, \
+                    seconds, number
+
+
+def bench_polynomial(repeat=3, sizes=(4, 16, 64, 256, 1024),
+                     crossover=(32, 64, 96, 128, 192, 256, 512)):
+    """Polynomial multiplication
+    
+    Times the multiplication of polynomials with 'sizes' coefficients,
+    with the path chosen by Polynomial.__mul__, and of polynomials with
+    'crossover' coefficients with each path (the direct convolution and
+    the FFT, forced with Polynomial.fft_threshold), to check the
+    threshold between them.
+    
+    """
+    
+    for size in sizes:
+        a = _poly(size, 1)
+        b = _poly(size, 2)
+        seconds, number = timeit(lambda: a * b, repeat)
+        yield 'Polynomial.__mul__', {'size': size}, seconds, number
+    
+    threshold = Polynomial.fft_threshold
+    for size in crossover:
+        a = _poly(size, 1)
+        b = _poly(size, 2)
+        for path, value in (('direct', sys.maxint), ('fft', 0)):
+            Polynomial.fft_threshold = value
+            try:
+                seconds, number = timeit(lambda: a * b, repeat)
+            finally:
+                Polynomial.fft_threshold = threshold
+            yield 'Polynomial.__mul__', {'size': size, 'path': path}, \
+                seconds, number
+
+
+def bench_transfer_function(repeat=3, orders=(2, 4, 8, 16)):
+    """Transfer function arithmetic"""
+    
+    for order in orders:
+        g = TransferFunction(_poly(order, 3), _poly(order + 1, 4))
+        h = TransferFunction(_poly(order, 5), _poly(order + 1, 6))
+        cases = [
+            ('TransferFunction.__add__', lambda: g + h),
+            ('TransferFunction.__mul__', lambda: g * h),
+            ('TransferFunction.feedback_unit', lambda: g.feedback_unit()),
+        ]
+        for name, call in cases:
+            seconds, number = timeit(call, repeat)
+            yield name, {'order': order}, seconds, number
+
+
+def bench_identification(repeat=3, samples=(10000, 100000)):
+    """Identification and tuning
+    
+    Times the identification (all the methods at once, with identify(),
+    and each method alone) and the tuning of the reaction curve of the
+    plant 1/(s + 1)^3 with 'samples' points.
+    
+    """
+    
+    g = _plant(3)
+    
+    for count in samples:
+        total_time = 20.0
+        t, y = discretization.ZOH(g, total_time / count, total_time)
+        params = {'samples': count}
+        
+        seconds, number = timeit(lambda: identification.identify(t, y),
+                                 repeat)
+        yield 'identify', params, seconds, number
+        
+        for method in identification.methods:
+            seconds, number = timeit(lambda: method(t, y).points, repeat)
+            yield method.__name__ + '.points', params, seconds, number
+        
+        for name in tuning.__all__:
+            method = getattr(tuning, name)
+            call = lambda: method(t, y, identification.Alfaro).gains
+            seconds, number = timeit(call, repeat)
+            yield name + '.gains', params, seconds, number
+
+
+suites = {
+    'discretization': bench_discretization,
+    'polynomial': bench_polynomial,
+    'transfer_function': bench_transfer_function,
+    'identification': bench_identification,
+}
+
+
+def run(names=None, repeat=3):
+    """Run the benchmarks
+    
+    Returns a dict, serializable to JSON, with the environment and the
+    results of the suites 'names' (all the suites, by default). Each
+    result is a dict with the keys 'suite', 'name', 'params', 'seconds'
+    (the best mean time of a call) and 'number' (calls by run).
+    
+    """
+    
+    if names is None:
+        names = sorted(suites)
+    
+    for name in names:
+        if name not in suites:
+            raise ControlSystemsError('Invalid suite: %s' % name)
+    
+    results = []
+    for name in names:
+        for case, params, seconds, number in suites[name](repeat):
+            results.append({
+                'suite': name,
+                'name': case,
+                'params': params,
+                'seconds': seconds,
+                'number': number,
+            })
+    
+    return {
+        'version': pidsim.core.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'backend': discretization.backend,
+        'repeat': repeat,
+        'results': results,
+    }
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+    pidsim.bench.__main__
+    ~~~~~~~~~~~~~~~~~~~~~
+    
+    Command line interface of the benchmark suite::
+    
+        $ python -m pidsim.bench --suite polynomial --output results.json
+    
+    :copyright: 2009-2010 by Rafael Goncalves Martins
+    :license: GPL-2, see LICENSE for more details.
+"""
+
+import json
+import optparse
+import sys
+
+from pidsim.bench import run, suites
+from pidsim.core import discretization
+from pidsim.core.error import ControlSystemsError
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        prog='python -m pidsim.bench',
+        usage='%prog [options]',
+        description='Runs the benchmarks of pidsim and prints the ' \
+                    'results as JSON.',
+    )
+    parser.add_option('-s', '--suite', action='append', dest='suites',
+                      metavar='SUITE', help='suite to run (may be used ' \
+                      'more than once): %s' % ', '.join(sorted(suites)))
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='runs of each benchmark [default: %default]')
+    parser.add_option('-b', '--backend', choices=['numpy', 'python'],
+                      help='backend of the numerical methods')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write the results to FILE instead of stdout')
+    options, args = parser.parse_args(argv)
+    
+    if options.backend is not None:
+        discretization.backend = options.backend
+    
+    try:
+        results = run(options.suites, options.repeat)
+    except ControlSystemsError, err:
+        parser.error(str(err))
+    
+    if options.output is None:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        sys.stdout.write('\n')
+    else:
+        fp = open(options.output, 'w')
+        try:
+            json.dump(results, fp, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+        finally:
+            fp.close()
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
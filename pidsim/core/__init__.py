@@ -14,7 +14,8 @@
 
 #TODO: write unit tests and docs
 
-__all__ = ['discretization', 'error', 'helpers', 'pade', 'pid', 'types']
+__all__ = ['discretization', 'error', 'helpers', 'pade', 'pid',
+           'pid_simulation', 'storage', 'types']
 __author__ = 'Rafael Goncalves Martins'
 __email__ = 'rafael@rafaelmartins.eng.br'
 __description__ = 'PID Controller simulator (PIDSIM)'
@@ -29,4 +30,6 @@ import error
 import helpers
 import pade
 import pid
+import pid_simulation
+import storage
 import types
@@ -8,6 +8,41 @@
     This module implements some numerical methods to discretize the
     Transfer Functions on the time domain.
     
+    For linear time-invariant systems, one step of any of these methods
+    reduces to the transition x' = Phi*x + Gamma*u, where Phi and Gamma
+    are computed once by the function 'compile_stepper'.
+    
+    The input 'u' of the methods is held constant between samples, and
+    can be:
+    
+    - None: unit step (the default);
+    - a number: step with this amplitude;
+    - a sequence: the values of the input at each sample (the last value
+      is held after the end of the sequence);
+    - an iterator: yields the values of the input at each sample (the
+      last value is held after the iterator stops);
+    - a callable: u(t) returns the value of the input at the time 't'.
+    
+    The methods return a SimulationResult object (see
+    pidsim.core.types), with the output in a contiguous array of doubles
+    and a lazy time axis. It can be unpacked as the tuple (t, y) returned
+    by the older versions.
+    
+    With 'sink', the name of a file, the points are written to this file
+    in chunks while the method runs, and the method returns a
+    MappedResult object that reads them back through a memory map (see
+    pidsim.core.storage), for simulations longer than the memory.
+    
+    The methods also accept a transport delay 'delay', in seconds. The
+    response is delayed through a circular buffer (see DelayLine), exact
+    at the sample instants for delays multiple of the sample time, and
+    linearly interpolated otherwise. Unlike the Pade approximations, it
+    doesn't add states to the model.
+    
+    To find where the time of a slow simulation goes, run it inside a
+    Profiler context (see Profiler). Without it, the methods aren't
+    instrumented at all.
+    
     :copyright: 2009-2010 by Rafael Goncalves Martins
     :license: GPL-2, see LICENSE for more details.
 """
@@ -15,104 +50,762 @@
 #TODO: discretize State-Space models too.
 #TODO: implement more numerical methods
 
-__all__ = ['Euler', 'RungeKutta2', 'RungeKutta3', 'RungeKutta4']
+__all__ = ['Euler', 'RungeKutta2', 'RungeKutta3', 'RungeKutta4', 'ZOH',
+           'BackwardEuler', 'Tustin', 'DormandPrince',
+           'compile_stepper', 'prepare_stepper', 'iter_response',
+           'batch_response', 'cache_info', 'cache_clear', 'Profiler']
+
+import itertools
+import timeit
+from array import array
 
 from pidsim.core.error import ControlSystemsError
+from pidsim.core.helpers import LRUCache, DelayLine
+from pidsim.core.storage import ResultWriter
 from pidsim.core.types import Matrix, ZerosMatrix, IdentityMatrix, \
-    TransferFunction, StateSpace
+    TransferFunction, StateSpace, TimeAxis, SimulationResult, numpy
 
+# Backend used to step the state vector: 'numpy' (contiguous float64
+# arrays) when NumPy is available, or 'python' (the Matrix type).
+backend = numpy is not None and 'numpy' or 'python'
 
-def Euler(g, sample_time, total_time):
-    """Euler Method
+# Caches of the state-space realizations of the transfer functions and of
+# the operators of the numerical methods, keyed by value.
+realizations = LRUCache(128)
+steppers = LRUCache(512)
+
+# Active profiler (see Profiler), or None.
+profiler = None
+
+# Butcher tableaus (a, b) of the explicit Runge-Kutta methods. 'a' have
+# the coefficients of the stages 2..n and 'b' the weights of the stages.
+tableaus = {
+    'Euler': ([], [1.0]),
+    'RungeKutta2': ([[1.0]], [0.5, 0.5]),
+    'RungeKutta3': ([[0.5], [0.0, 0.75]], [2.0/9.0, 1.0/3.0, 4.0/9.0]),
+    'RungeKutta4': ([[0.5], [0.0, 0.5], [0.0, 0.0, 1.0]],
+                    [1.0/6.0, 1.0/3.0, 1.0/3.0, 1.0/6.0]),
+}
+
+
+class Profiler(object):
+    """Profiler of the numerical methods
     
-    Returns the points of the step response of the transfer function 'g',
-    discretized with the Euler method, using the sample time 'sample_time'
-    on 'total_time' seconds. For example::
+    Context manager that instruments the numerical methods called inside
+    it. For example::
     
         >>> g = TransferFunction([1], [1, 2, 3])
-        >>> t, y = Euler(g, 0.01, 10)
-        >>> print t
-        (prints a vector of times 0-10s, with the sample time 0.01s)
-        >>> print y
-        (prints a vector of points, with the same size of 't')
+        >>> with Profiler() as profiler:
+        ...     t, y = RungeKutta4(g, 0.01, 10)
+        ...
+        >>> profiler.phases
+        (returns a dict with the wall time of each phase)
+        >>> profiler.samples
+        1001
+        >>> profiler.ops
+        (returns a dict with the number of calls of each matrix operation)
+    
+    The attributes are:
+    
+    - phases: a dict with the wall time, in seconds, of each phase:
+      'realization' (conversion of the transfer function to state-space),
+      'operators' (computation of Phi and Gamma) and 'step' (the step
+      loop, including the conversion of the operators to the backend);
+    - samples: the number of samples computed by the step loops;
+    - ops: a dict with the number of calls of each matrix operation;
+    - allocations: the number of matrices created by these operations.
+    
+    If 'callback' is given, callback(phase, seconds) is called at the end
+    of each phase. Phases that hit the caches (see cache_info) aren't
+    run, then they aren't reported.
+    
+    The matrix operations are counted by wrapping the methods of the
+    Matrix type (and the functions of the NumPy backend) while the
+    context is active, then the methods run without any overhead outside
+    of it.
+    
+    """
+    
+    counted = ['__add__', '__sub__', '__mul__', 'mult', 'transpose']
+    
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.phases = {}
+        self.samples = 0
+        self.ops = {}
+        self.allocations = 0
+        self._previous = None
+        self._originals = {}
+    
+    def __enter__(self):
+        global profiler
+        for name in self.counted + ['__init__']:
+            self._originals[name] = Matrix.__dict__[name]
+        for name in self.counted:
+            setattr(Matrix, name, self.counter('Matrix.' + name,
+                                               self._originals[name]))
+        setattr(Matrix, '__init__', self.counter(None,
+                                                 self._originals['__init__'],
+                                                 allocates=True))
+        self._previous = profiler
+        profiler = self
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        global profiler
+        profiler = self._previous
+        for name, method in self._originals.items():
+            setattr(Matrix, name, method)
+        self._originals = {}
+        return False
+    
+    def counter(self, name, function, allocates=False):
+        """Returns 'function' wrapped to count its calls as the
+        operation 'name' (if not None) and as an allocation (if
+        'allocates')"""
+        
+        ops = self.ops
+        
+        def wrapper(*args, **kwargs):
+            if name is not None:
+                ops[name] = ops.get(name, 0) + 1
+            if allocates:
+                self.allocations += 1
+            return function(*args, **kwargs)
+        
+        return wrapper
+    
+    def start(self):
+        """Returns the start time of a phase"""
+        
+        return timeit.default_timer()
+    
+    def stop(self, phase, start, samples=0):
+        """Accounts the time since 'start' and the 'samples' to the phase
+        'phase'. Returns the current time, to start the next phase."""
+        
+        now = timeit.default_timer()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - start)
+        self.samples += samples
+        if self.callback is not None:
+            self.callback(phase, now - start)
+        return now
+
+
+def _backend():
+    """Numerical backend
+    
+    Returns the functions (convert, dot, scale) of the current backend.
+    'convert' receives a Matrix object and returns the object used by the
+    step loop, 'dot' multiplies 2 of these objects and 'scale' multiplies
+    one of them by a number.
+    
+    """
+    
+    if backend == 'numpy':
+        if numpy is None:
+            raise ControlSystemsError('NumPy backend not available')
+        if profiler is not None:
+            return Matrix.array, \
+                profiler.counter('numpy.dot', numpy.dot, True), \
+                profiler.counter('numpy.multiply', numpy.multiply, True)
+        return Matrix.array, numpy.dot, numpy.multiply
+    
+    if backend == 'python':
+        return Matrix, Matrix.__mul__, Matrix.mult
+    
+    raise ControlSystemsError('Invalid backend: %s' % backend)
+
+
+def compile_stepper(g, method, sample_time):
+    """Single-step transition operator
+    
+    Returns the matrices (Phi, Gamma, C, D) of the step of the numerical
+    method 'method' (the name of one of the methods of this module) for
+    the transfer function 'g', using the sample time 'sample_time'. The
+    state 'x' and the output 'y' of the response to the input 'u' are
+    given by::
+    
+        x[k+1] = Phi*x[k] + Gamma*u[k]
+        y[k] = C*x[k] + D*u[k]
+    
+    The matrices are cached (see cache_info), then they are shared by
+    the calls with the same arguments and must not be modified. For
+    example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> phi, gamma, c, d = compile_stepper(g, 'Euler', 0.1)
+        >>> print phi
+        1.0     0.1
+        -0.3    0.8
     
     """
     
     if not isinstance(g, TransferFunction):
         raise ControlSystemsError('Parameter must be a Transfer Fcn.')
+    
+    key = (g.key(), method, sample_time)
+    
+    stepper = steppers.get(key)
+    if stepper is not None:
+        return stepper
+    
+    ss = _realization(g)
+    
+    prof = profiler
+    if prof is not None:
+        start = prof.start()
+    
+    if method in tableaus:
+        phi, gamma = _runge_kutta(ss, tableaus[method], sample_time)
+    elif method in operators:
+        phi, gamma = operators[method](ss, sample_time)
+    else:
+        raise ControlSystemsError('Invalid method: %s' % method)
+    
+    if prof is not None:
+        prof.stop('operators', start)
+    
+    stepper = phi, gamma, ss.c, ss.d
+    steppers[key] = stepper
+    
+    return stepper
 
-    ss = StateSpace(g)
+
+def _realization(g):
+    """State-space realization
     
-    samples = int(total_time/sample_time)
+    Returns the StateSpace object of the transfer function 'g', from the
+    cache if available.
+    
+    """
+    
+    key = g.key()
+    
+    ss = realizations.get(key)
+    if ss is None:
+        prof = profiler
+        if prof is not None:
+            start = prof.start()
+        ss = StateSpace(g)
+        realizations[key] = ss
+        if prof is not None:
+            prof.stop('realization', start)
+    
+    return ss
+
+
+def cache_info():
+    """Cache statistics
+    
+    Returns a dict with the statistics (hits, misses, maxsize, currsize)
+    of the caches of realizations and operators. For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> t, y = RungeKutta4(g, 0.01, 10)
+        >>> t, y = RungeKutta4(g, 0.01, 20)
+        >>> cache_info()['steppers']
+        CacheInfo(hits=1, misses=1, maxsize=512, currsize=1)
+    
+    """
+    
+    return {
+        'realizations': realizations.info(),
+        'steppers': steppers.info(),
+    }
+
+
+def cache_clear():
+    """Clear the caches of realizations and operators"""
+    
+    realizations.clear()
+    steppers.clear()
+
+
+def _runge_kutta(ss, tableau, sample_time):
+    """Explicit Runge-Kutta operators
     
-    t = [sample_time * a for a in range(samples+1)]
+    Returns the matrices (Phi, Gamma) of the explicit Runge-Kutta method
+    with the Butcher tableau 'tableau', for the state-space model 'ss'.
     
-    x = ZerosMatrix(ss.a.rows, 1)
-    y = [0.0]
+    """
     
     eye = IdentityMatrix(ss.a.rows)
     
-    a1 = eye + ss.a.mult(sample_time)
-    a2 = ss.b.mult(sample_time)
+    a_t = ss.a.mult(sample_time) # A*T
+    b_t = ss.b.mult(sample_time) # B*T
+    
+    # Each stage is k[i] = m[i]*x + v[i], with
+    # k[i] = A*T*(x + sum(a[i][j]*k[j])) + B*T
+    a, b = tableau
+    m = [a_t]
+    v = [b_t]
+    
+    for coefs in a:
+        m_sum = eye
+        v_sum = ZerosMatrix(ss.a.rows, 1)
+        for j in range(len(coefs)):
+            if coefs[j] != 0:
+                m_sum = m_sum + m[j].mult(coefs[j])
+                v_sum = v_sum + v[j].mult(coefs[j])
+        m.append(a_t * m_sum)
+        v.append(a_t * v_sum + b_t)
     
-    for i in range(samples):
-        x = a1*x + a2
-        y.append((ss.c*x)[0][0] + ss.d[0][0])
+    phi = eye
+    gamma = ZerosMatrix(ss.a.rows, 1)
+    
+    for i in range(len(b)):
+        phi = phi + m[i].mult(b[i])
+        gamma = gamma + v[i].mult(b[i])
+    
+    return phi, gamma
+
 
-    return t, y
+def _zoh(ss, sample_time):
+    """Zero-order hold operators
+    
+    Returns the exact matrices (Phi, Gamma) of the state-space model 'ss'
+    with the input held constant between samples. They are taken from
+    the exponential of the augmented matrix::
+    
+        expm([A B] * T) = [Phi Gamma]
+             [0 0]        [0   I    ]
+    
+    """
+    
+    n = ss.a.rows
+    
+    aug = ZerosMatrix(n + 1)
+    for i in range(n):
+        for j in range(n):
+            aug[i][j] = ss.a[i][j] * sample_time
+        aug[i][n] = ss.b[i][0] * sample_time
+    
+    exp = aug.expm()
+    
+    phi = Matrix([row[:n] for row in exp[:n]])
+    gamma = Matrix([[row[n]] for row in exp[:n]])
+    
+    return phi, gamma
 
 
-def RungeKutta2(g, sample_time, total_time):
-    """RungeKutta2 Method
+def _lu_factor(m):
+    """LU factorization
+    
+    Returns the LU factorization, with partial pivoting, of the square
+    Matrix 'm', as a tuple (lu, pivots), where 'lu' has the factors L
+    (below the diagonal, with unit diagonal) and U.
+    
+    """
+    
+    n = m.rows
+    lu = [[float(x) for x in row] for row in m]
+    pivots = range(n)
+    
+    for k in range(n):
+        p = max(range(k, n), key=lambda i: abs(lu[i][k]))
+        if lu[p][k] == 0:
+            raise ControlSystemsError('Singular matrix')
+        if p != k:
+            lu[k], lu[p] = lu[p], lu[k]
+            pivots[k], pivots[p] = pivots[p], pivots[k]
+        for i in range(k + 1, n):
+            factor = lu[i][k] / lu[k][k]
+            lu[i][k] = factor
+            if factor != 0:
+                for j in range(k + 1, n):
+                    lu[i][j] -= factor * lu[k][j]
+    
+    return lu, pivots
+
+
+def _lu_solve(factorization, m):
+    """Linear system solution
+    
+    Returns a Matrix object with the solution X of the system A*X = 'm',
+    where 'factorization' is the LU factorization of A (see _lu_factor).
+    
+    """
+    
+    lu, pivots = factorization
+    n = len(lu)
+    
+    res = ZerosMatrix(n, m.cols)
+    
+    for col in range(m.cols):
+        x = [float(m[pivots[i]][col]) for i in range(n)]
+        for i in range(n):
+            for j in range(i):
+                x[i] -= lu[i][j] * x[j]
+        for i in range(n - 1, -1, -1):
+            for j in range(i + 1, n):
+                x[i] -= lu[i][j] * x[j]
+            x[i] /= lu[i][i]
+        for i in range(n):
+            res[i][col] = x[i]
+    
+    return res
+
+
+def _backward_euler(ss, sample_time):
+    """Backward Euler operators
+    
+    Returns the matrices (Phi, Gamma) of the implicit (backward) Euler
+    method, from a single factorization of M = I - A*T::
+    
+        Phi = M^-1
+        Gamma = M^-1 * B*T
+    
+    """
+    
+    eye = IdentityMatrix(ss.a.rows)
+    
+    lu = _lu_factor(eye - ss.a.mult(sample_time))
+    
+    return _lu_solve(lu, eye), _lu_solve(lu, ss.b.mult(sample_time))
+
+
+def _tustin(ss, sample_time):
+    """Tustin operators
+    
+    Returns the matrices (Phi, Gamma) of the trapezoidal (Tustin) method,
+    from a single factorization of M = I - A*T/2::
+    
+        Phi = M^-1 * (I + A*T/2)
+        Gamma = M^-1 * B*T
+    
+    """
+    
+    eye = IdentityMatrix(ss.a.rows)
+    half = ss.a.mult(sample_time / 2.0)
+    
+    lu = _lu_factor(eye - half)
+    
+    return _lu_solve(lu, eye + half), _lu_solve(lu, ss.b.mult(sample_time))
+
+
+# Numerical methods that aren't based on Butcher tableaus. Each function
+# receives a StateSpace object and the sample time, and returns the
+# matrices (Phi, Gamma).
+operators = {
+    'ZOH': _zoh,
+    'BackwardEuler': _backward_euler,
+    'Tustin': _tustin,
+}
+
+
+def prepare_stepper(phi, gamma, c, d):
+    """Step loop preparation
+    
+    Returns the functions 'dot' and 'scale' of the current backend, the
+    initial (zero) state and the operators (Phi, Gamma, C, D) returned by
+    compile_stepper, converted to the backend, with D as a number. The
+    step loops of this module and of other simulators start with it.
+    For example::
+    
+        >>> stepper = compile_stepper(g, 'ZOH', 0.01)
+        >>> dot, scale, x, phi, gamma, c, d = prepare_stepper(*stepper)
+        >>> x = dot(phi, x) + scale(gamma, 1.0)
+        >>> y = dot(c, x)[0][0] + d * 1.0
+    
+    """
+    
+    convert, dot, scale = _backend()
+    
+    x = convert(ZerosMatrix(phi.rows, 1))
+    
+    return dot, scale, x, convert(phi), convert(gamma), convert(c), d[0][0]
+
+
+def _inputs(u, sample_time):
+    """Input signal
+    
+    Returns an iterator with the values of the input 'u' (see the
+    documentation of this module) at each sample, forever.
+    
+    """
+    
+    if u is None:
+        return itertools.repeat(1.0)
+    
+    if isinstance(u, (int, long, float)):
+        return itertools.repeat(float(u))
+    
+    if callable(u):
+        return (float(u(sample_time * i)) for i in itertools.count())
+    
+    def hold(values):
+        value = 0.0
+        for value in values:
+            yield float(value)
+        while True:
+            yield value
+    
+    return hold(u)
+
+
+def _output(delay, sample_time):
+    """Output function
+    
+    Returns the function that receives each point of the response and
+    returns it delayed by 'delay' seconds, or just converted to float if
+    there's no delay.
+    
+    """
+    
+    if not delay:
+        return float
+    
+    return DelayLine(float(delay) / sample_time).push
+
+
+def _step_response(g, method, sample_time, total_time, u=None, delay=0.0,
+                   sink=None):
+    """Response
+    
+    Returns the points (t, y) of the response of the transfer function
+    'g' to the input 'u', discretized with the numerical method 'method'.
+    The product Gamma*u is only recomputed when the input changes. The
+    points are written to the file 'sink', if given.
+    
+    """
+    
+    stepper = compile_stepper(g, method, sample_time)
+    
+    prof = profiler
+    if prof is not None:
+        start = prof.start()
     
-    Returns the points of the step response to the transfer function 'g',
-    discretized with the Runge Kutta (order 2) method, using the sample
-    time 'sample_time' on 'total_time' seconds. For example::
+    dot, scale, x, phi, gamma, c, d = prepare_stepper(*stepper)
+    
+    samples = int(total_time/sample_time)
+    
+    inputs = _inputs(u, sample_time)
+    output = _output(delay, sample_time)
+    
+    if sink is None:
+        y = array('d')
+        append = y.append
+    else:
+        writer = ResultWriter(sink, sample_time)
+        append = writer.append
+    
+    try:
+        value = next(inputs)
+        gamma_u = scale(gamma, value)
+        append(output(dot(c, x)[0][0] + d * value))
+        
+        for i in range(samples):
+            x = dot(phi, x) + gamma_u
+            new = next(inputs)
+            if new != value:
+                value = new
+                gamma_u = scale(gamma, value)
+            append(output(dot(c, x)[0][0] + d * value))
+    finally:
+        if sink is not None:
+            writer.finish()
+    
+    if prof is not None:
+        prof.stop('step', start, samples+1)
+    
+    if sink is not None:
+        return writer.close()
+    
+    return SimulationResult(y, sample_time)
+
+
+def iter_response(g, sample_time, method='RungeKutta4', total_time=None,
+                  u=None, delay=0.0):
+    """Response generator
+    
+    Yields the points (t, y) of the response to the transfer function
+    'g' to the input 'u' (a unit step, by default), discretized with the
+    numerical method 'method', using the sample time 'sample_time'. The
+    points are computed lazily, one per iteration, then the memory used
+    doesn't depend on the number of samples. If 'total_time' is None, the
+    generator never stops. For example::
     
         >>> g = TransferFunction([1], [1, 2, 3])
-        >>> t, y = RungeKutta2(g, 0.01, 10)
+        >>> for t, y in iter_response(g, 0.01, 'Euler', 10):
+        ...     print t, y
+        ...
+        (prints the points 0-10s, with the sample time 0.01s)
+    
+    """
+    
+    dot, scale, x, phi, gamma, c, d = prepare_stepper(*compile_stepper(
+        g, method, sample_time))
+    
+    if total_time is None:
+        samples = None
+    else:
+        samples = int(total_time/sample_time)
+    
+    inputs = _inputs(u, sample_time)
+    output = _output(delay, sample_time)
+    
+    value = next(inputs)
+    gamma_u = scale(gamma, value)
+    
+    yield 0.0, output(dot(c, x)[0][0] + d * value)
+    
+    i = 1
+    while samples is None or i <= samples:
+        x = dot(phi, x) + gamma_u
+        new = next(inputs)
+        if new != value:
+            value = new
+            gamma_u = scale(gamma, value)
+        yield sample_time * i, output(dot(c, x)[0][0] + d * value)
+        i += 1
+
+
+def batch_response(gs, sample_time, total_time, method='RungeKutta4',
+                   u=None, delay=0.0):
+    """Responses of many transfer functions
+    
+    Returns the points (t, y) of the responses of all the transfer
+    functions of the list 'gs' to the input 'u' (a unit step, by
+    default), discretized with the numerical method 'method', using the
+    sample time 'sample_time' on 'total_time' seconds. 'y' is a 2-D
+    block: a list with one row per transfer function, each row an
+    array('d') with the points of its response, with both backends.
+    
+    With the NumPy backend, the operators of all the transfer functions
+    are padded with zeros to the highest order and stacked, then all the
+    states are stepped together by a single product per sample. For
+    example::
+    
+        >>> gs = [TransferFunction([1], [1, 2, k]) for k in range(1, 5)]
+        >>> t, y = batch_response(gs, 0.01, 10)
         >>> print t
         (prints a vector of times 0-10s, with the sample time 0.01s)
-        >>> print y
-        (prints a vector of points, with the same size of 't')
+        >>> print y[0]
+        (prints the vector of points of the first transfer function)
     
     """
     
-    if not isinstance(g, TransferFunction):
-        raise ControlSystemsError('Parameter must be a Transfer Fcn.')
-
-    ss = StateSpace(g)
+    steppers = [compile_stepper(g, method, sample_time) for g in gs]
+    
+    prof = profiler
+    if prof is not None:
+        start = prof.start()
     
     samples = int(total_time/sample_time)
     
-    t = [sample_time * a for a in range(samples+1)]
+    t = TimeAxis(0.0, sample_time, samples+1)
     
-    x = ZerosMatrix(ss.a.rows, 1)
-    y = [0.0]
+    # the input is shared by all the transfer functions
+    inputs = [value for value in itertools.islice(_inputs(u, sample_time),
+                                                  samples+1)]
     
-    eye = IdentityMatrix(ss.a.rows)
+    if backend != 'numpy':
+        y = []
+        for stepper in steppers:
+            dot, scale, x, phi, gamma, c, d = prepare_stepper(*stepper)
+            output = _output(delay, sample_time)
+            resp = array('d', [output(dot(c, x)[0][0] + d * inputs[0])])
+            for i in range(samples):
+                x = dot(phi, x) + scale(gamma, inputs[i])
+                resp.append(output(dot(c, x)[0][0] + d * inputs[i+1]))
+            y.append(resp)
+        if prof is not None:
+            prof.stop('step', start, len(steppers) * (samples+1))
+        return t, y
+    
+    if numpy is None:
+        raise ControlSystemsError('NumPy backend not available')
+    
+    plants = len(steppers)
+    order = max([phi.rows for phi, gamma, c, d in steppers] + [0])
+    
+    # Padded states aren't excited by Gamma, then they remain zero.
+    phi = numpy.zeros((plants, order, order))
+    gamma = numpy.zeros((plants, order))
+    c = numpy.zeros((plants, order))
+    d = numpy.zeros(plants)
+    
+    for p in range(plants):
+        n = steppers[p][0].rows
+        phi[p, :n, :n] = steppers[p][0].array()
+        gamma[p, :n] = steppers[p][1].array()[:, 0]
+        c[p, :n] = steppers[p][2].array()[0]
+        d[p] = steppers[p][3][0][0]
+    
+    x = numpy.zeros((plants, order))
+    y = numpy.zeros((plants, samples+1))
+    y[:, 0] = d * inputs[0]
+    
+    for i in range(1, samples+1):
+        x = numpy.einsum('pij,pj->pi', phi, x) + gamma * inputs[i-1]
+        y[:, i] = numpy.einsum('pi,pi->p', c, x) + d * inputs[i]
     
-    a1 = ss.a * ss.a
-    a2 = ss.a.mult(2) + a1.mult(sample_time)
-    a3 = a2.mult(0.5)
-    a4 = ss.a.mult(sample_time)
-    a5 = a4*ss.b + ss.b.mult(2)
-    a6 = eye + a3.mult(sample_time)
-    a7 = a5.mult(sample_time/2)
+    if delay:
+        # the same delay line of the other methods, applied to the whole
+        # block: y[k - whole]*(1 - fraction) + y[k - whole - 1]*fraction
+        whole = int(float(delay) / sample_time)
+        fraction = float(delay) / sample_time - whole
+        delayed = numpy.zeros((plants, samples + whole + 2))
+        delayed[:, whole:whole + samples + 1] += (1 - fraction) * y
+        delayed[:, whole + 1:whole + samples + 2] += fraction * y
+        y = delayed[:, :samples + 1]
     
-    for i in range(samples):
-        x = a6*x + a7
-        y.append((ss.c*x)[0][0] + ss.d[0][0])
+    if prof is not None:
+        prof.stop('step', start, plants * (samples+1))
+    
+    return t, [array('d', row.tolist()) for row in y]
 
-    return t, y
 
+def Euler(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """Euler Method
+    
+    Returns the points of the response of the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the Euler
+    method, using the sample time 'sample_time' on 'total_time' seconds.
+    For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> t, y = Euler(g, 0.01, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.01s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    """
+    
+    return _step_response(g, 'Euler', sample_time, total_time, u,
+                          delay, sink)
 
-def RungeKutta3(g, sample_time, total_time):
+
+def RungeKutta2(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """RungeKutta2 Method
+    
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the Runge
+    Kutta (order 2) method, using the sample time 'sample_time' on
+    'total_time' seconds. For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> t, y = RungeKutta2(g, 0.01, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.01s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    """
+    
+    return _step_response(g, 'RungeKutta2', sample_time, total_time, u,
+                          delay, sink)
+
+
+def RungeKutta3(g, sample_time, total_time, u=None, delay=0.0, sink=None):
     """RungeKutta3 Method
     
-    Returns the points of the step response to the transfer function 'g',
-    discretized with the Runge Kutta (order 3) method, using the sample
-    time 'sample_time' on 'total_time' seconds. For example::
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the Runge
+    Kutta (order 3) method, using the sample time 'sample_time' on
+    'total_time' seconds. For example::
     
         >>> g = TransferFunction([1], [1, 2, 3])
         >>> t, y = RungeKutta3(g, 0.01, 10)
@@ -123,105 +816,355 @@ def RungeKutta3(g, sample_time, total_time):
     
     """
     
-    if not isinstance(g, TransferFunction):
-        raise ControlSystemsError('Parameter must be a Transfer Fcn.')
+    return _step_response(g, 'RungeKutta3', sample_time, total_time, u,
+                          delay, sink)
+
 
-    ss = StateSpace(g)
+def RungeKutta4(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """RungeKutta4 Method
     
-    samples = int(total_time/sample_time)
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the Runge
+    Kutta (order 4) method, using the sample time 'sample_time' on
+    'total_time' seconds. For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> t, y = RungeKutta4(g, 0.01, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.01s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
     
-    t = [sample_time * a for a in range(samples+1)]
+    """
     
-    x = ZerosMatrix(ss.a.rows, 1)
-    y = [0.0]
+    return _step_response(g, 'RungeKutta4', sample_time, total_time, u,
+                          delay, sink)
+
+
+def ZOH(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """Zero-Order Hold Method
     
-    eye = IdentityMatrix(ss.a.rows)
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the exact
+    zero-order hold method, using the sample time 'sample_time' on
+    'total_time' seconds. The transition matrices are computed with the
+    matrix exponential, then the points are exact for any sample time.
+    For example::
     
-    a1 = ss.a.mult(sample_time) # A*T
-    a2 = ss.b.mult(sample_time) # B*T
-    a3 = (ss.a * ss.a).mult(sample_time * sample_time) # A^2*T^2
-    a4 = a3.mult(0.5) # (A^2*T^2)/2
-    a5 = (ss.a * ss.b).mult(sample_time * sample_time) # A*B*T^2
-    a6 = a5.mult(0.5) # (A*B*T^2)/2
-    a7 = a3.mult(3.0/4.0) # (A^2*T^2)*(3/4)
-    a8 = (ss.a*ss.a*ss.a).mult(sample_time * sample_time * sample_time)
-    a9 = a8.mult(3.0/8.0)
-    a10 = (ss.a*ss.a*ss.b).mult(sample_time * sample_time * sample_time)
-    a11 = a10.mult(3.0/8.0)
-    a12 = a5.mult(3.0/4.0) + a2
-    
-    for i in range(samples):
-        k1 = a1*x + a2
-        k2 = (a1 + a4)*x + a6 + a2
-        k3 = (a1 + a7 + a9)*x + a11 + a12
-        
-        x = x + (k1.mult(2.0/9.0) + k2.mult(1.0/3.0) + k3.mult(4.0/9.0))
-        
-        y.append((ss.c*x)[0][0] + ss.d[0][0])
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> t, y = ZOH(g, 0.1, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.1s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    """
+    
+    return _step_response(g, 'ZOH', sample_time, total_time, u,
+                          delay, sink)
 
-    return t, y
 
+def BackwardEuler(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """Backward Euler Method
+    
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the
+    implicit (backward) Euler method, using the sample time 'sample_time'
+    on 'total_time' seconds. The method is stable for any sample time if
+    the plant is stable, then stiff plants can be simulated with sample
+    times chosen by the accuracy. For example::
+    
+        >>> g = TransferFunction([1], [1, 1001, 1000])
+        >>> t, y = BackwardEuler(g, 0.01, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.01s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    """
+    
+    return _step_response(g, 'BackwardEuler', sample_time, total_time, u,
+                          delay, sink)
 
-def RungeKutta4(g, sample_time, total_time):
-    """RungeKutta4 Method
+
+def Tustin(g, sample_time, total_time, u=None, delay=0.0, sink=None):
+    """Tustin Method
+    
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), discretized with the
+    implicit trapezoidal (Tustin) method, using the sample time
+    'sample_time' on 'total_time' seconds. Like the backward Euler method,
+    it's stable for any sample time if the plant is stable, but it's
+    second order accurate. For example::
+    
+        >>> g = TransferFunction([1], [1, 1001, 1000])
+        >>> t, y = Tustin(g, 0.01, 10)
+        >>> print t
+        (prints a vector of times 0-10s, with the sample time 0.01s)
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    """
+    
+    return _step_response(g, 'Tustin', sample_time, total_time, u,
+                          delay, sink)
+
+
+# Coefficients of the Dormand-Prince 5(4) method: nodes, Butcher tableau,
+# weights of the 5th order solution, weights of the error estimate (with
+# the 7th stage, evaluated at the new point) and coefficients of the dense
+# output (by powers of the step fraction).
+_dp_c = [0.0, 1.0/5, 3.0/10, 4.0/5, 8.0/9, 1.0]
+_dp_a = [
+    [],
+    [1.0/5],
+    [3.0/40, 9.0/40],
+    [44.0/45, -56.0/15, 32.0/9],
+    [19372.0/6561, -25360.0/2187, 64448.0/6561, -212.0/729],
+    [9017.0/3168, -355.0/33, 46732.0/5247, 49.0/176, -5103.0/18656],
+]
+_dp_b = [35.0/384, 0.0, 500.0/1113, 125.0/192, -2187.0/6784, 11.0/84]
+_dp_e = [-71.0/57600, 0.0, 71.0/16695, -71.0/1920, 17253.0/339200,
+         -22.0/525, 1.0/40]
+_dp_p = [
+    [1.0, -8048581381.0/2820520608, 8663915743.0/2820520608,
+     -12715105075.0/11282082432],
+    [0.0, 0.0, 0.0, 0.0],
+    [0.0, 131558114200.0/32700410799, -68118460800.0/10900136933,
+     87487479700.0/32700410799],
+    [0.0, -1754552775.0/470086768, 14199869525.0/1410260304,
+     -10690763975.0/1880347072],
+    [0.0, 127303824393.0/49829197408, -318862633887.0/49829197408,
+     701980252875.0/199316789632],
+    [0.0, -282668133.0/205662961, 2019193451.0/616988883,
+     -1453857185.0/822651844],
+    [0.0, 40617522.0/29380423, -110615467.0/29380423,
+     69997945.0/29380423],
+]
+
+
+def _input_function(u, sample_time, samples):
+    """Input function
+    
+    Returns the tuple (function, changes), where 'function' returns the
+    value of the input 'u' (see the documentation of this module) at the
+    time 't'. Sequences and iterators are held constant between samples,
+    and 'changes' is the list of the samples where the held value
+    changes. For callables, whose changes are unknown, 'changes' is None.
     
-    Returns the points of the step response to the transfer function 'g',
-    discretized with the Runge Kutta (order 4) method, using the sample
-    time 'sample_time' on 'total_time' seconds. For example::
+    """
+    
+    if u is None:
+        return (lambda t: 1.0), []
+    
+    if isinstance(u, (int, long, float)):
+        value = float(u)
+        return (lambda t: value), []
+    
+    if callable(u):
+        return (lambda t: float(u(t))), None
+    
+    values = list(itertools.islice(_inputs(u, sample_time), samples+1))
+    
+    def held(t):
+        i = int(t / sample_time + 1e-9)
+        return values[max(0, min(i, samples))]
+    
+    changes = [i for i in range(1, len(values)) if values[i] != values[i-1]]
+    
+    return held, changes
+
+
+def DormandPrince(g, sample_time, total_time, u=None, delay=0.0, rtol=1e-6,
+                  atol=1e-9, max_step=None, stats=None, sink=None):
+    """Dormand-Prince Method
+    
+    Returns the points of the response to the transfer function 'g' to
+    the input 'u' (a unit step, by default), integrated with the adaptive
+    Dormand-Prince 5(4) method on 'total_time' seconds, and interpolated
+    on the times multiple of 'sample_time'. The steps are chosen to keep
+    the local error estimate lower than 'atol + rtol*abs(x)' for each
+    state 'x', then slow transients are integrated with large steps, that
+    may be longer than 'sample_time'. For example::
     
         >>> g = TransferFunction([1], [1, 2, 3])
-        >>> t, y = RungeKutta4(g, 0.01, 10)
+        >>> stats = {}
+        >>> t, y = DormandPrince(g, 0.01, 10, stats=stats)
         >>> print t
         (prints a vector of times 0-10s, with the sample time 0.01s)
         >>> print y
         (prints a vector of points, with the same size of 't')
+        >>> print stats['accepted'], stats['rejected']
+        (prints the number of accepted and rejected steps)
+    
+    The steps are never longer than 'max_step' seconds. Sequences and
+    iterators are held constant between samples, and each step ends at
+    the next sample where the held value changes, then short pulses
+    aren't skipped. The changes of callables are unknown, then
+    'max_step' is 'sample_time' by default for them, and unbounded for
+    the other inputs.
+    
+    If 'stats' is a dict, it's filled with the number of accepted and
+    rejected steps, the number of evaluations of the derivative and the
+    minimum and maximum accepted steps.
     
     """
     
     if not isinstance(g, TransferFunction):
         raise ControlSystemsError('Parameter must be a Transfer Fcn.')
-
-    ss = StateSpace(g)
+    
+    ss = _realization(g)
+    
+    prof = profiler
+    if prof is not None:
+        start = prof.start()
+    
+    n = ss.a.rows
+    a = [list(row) for row in ss.a]
+    b = [row[0] for row in ss.b]
+    c = list(ss.c[0])
+    d = ss.d[0][0]
     
     samples = int(total_time/sample_time)
+    end = samples * sample_time
     
-    t = [sample_time * a for a in range(samples+1)]
+    u, changes = _input_function(u, sample_time, samples)
     
-    x = ZerosMatrix(ss.a.rows, 1)
-    y = [0.0]
+    if max_step is None:
+        if changes is None:
+            max_step = sample_time
+        else:
+            max_step = end
+    elif max_step <= 0:
+        raise ControlSystemsError('Invalid maximum step: %r' % max_step)
     
-    eye = IdentityMatrix(ss.a.rows)
+    # ends of the intervals where the input is held constant
+    if changes is None:
+        limits = [end]
+    else:
+        limits = [sample_time * i for i in changes] + [end]
+    limits.reverse()
+    
+    def derivative(value, x):
+        return [sum([a[i][j] * x[j] for j in range(n)]) + b[i] * value \
+                for i in range(n)]
     
-    a1 = ss.a.mult(sample_time) # A*T
-    a2 = ss.b.mult(sample_time) # B*T
-    a3 = (ss.a * ss.a).mult(sample_time * sample_time) # A^2*T^2
-    a4 = a3.mult(0.5) # (A^2*T^2)/2
-    a5 = (ss.a * ss.b).mult(sample_time * sample_time) # A*B*T^2
-    a6 = a5.mult(0.5) # (A*B*T^2)/2
-    a7 = (ss.a*ss.a*ss.a).mult(sample_time * sample_time * sample_time)
-    a8 = a7.mult(0.25)
-    a9 = (ss.a*ss.a*ss.b).mult(sample_time * sample_time * sample_time)
-    a10 = a9.mult(0.25)
-    a11 = a7.mult(0.5)
-    a12 = (ss.a*ss.a*ss.a*ss.a).mult(sample_time * sample_time * \
-           sample_time * sample_time)
-    a13 = a12.mult(0.25)
-    a14 = ss.a.mult(sample_time * sample_time)
-    a15 = a14*ss.b
-    a16 = a9.mult(0.5)
-    a17 = (ss.a*ss.a*ss.a*ss.b).mult(sample_time * sample_time * \
-           sample_time * sample_time)
-    a18 = a17.mult(0.25)
-    
-    for i in range(samples):
-        k1 = a1*x + a2
-        k2 = (a1 + a4)*x + a6 + a2
-        k3 = (a1 + a4 + a8)*x + a2 + a6 + a10;
-        k4 = (a1 + a3 + a11 + a13)*x + a15 +a16 + a18 + a2
+    def output(time, x):
+        return sum([c[i] * x[i] for i in range(n)]) + d * u(time)
+    
+    x = [0.0] * n
+    delayed = _output(delay, sample_time)
+    
+    if sink is None:
+        y = array('d')
+        append = y.append
+    else:
+        writer = ResultWriter(sink, sample_time)
+        append = writer.append
+    
+    try:
+        append(delayed(output(0.0, x)))
         
-        x = x + k1.mult(1.0/6.0) + k2.mult(1.0/3.0) + k3.mult(1.0/3.0) \
-              + k4.mult(1.0/6.0)
+        accepted = rejected = 0
+        evaluations = 1
+        shortest = longest = None
         
-        y.append((ss.c*x)[0][0] + ss.d[0][0])
-
-    return t, y
+        time = 0.0
+        limit = limits.pop()
+        step = min(sample_time, max_step)
+        value = u(time)
+        k1 = derivative(value, x)
+        i = 1
+        
+        while i <= samples:
+            step = min(step, max_step, limit - time)
+            
+            # held inputs are constant inside the step
+            if changes is None:
+                inputs = [u(time + _dp_c[s] * step) for s in range(1, 6)] + \
+                         [u(time + step)]
+            else:
+                inputs = [value] * 6
+            
+            k = [k1]
+            for s in range(1, 6):
+                stage = [x[j] + step * sum([_dp_a[s][m] * k[m][j] \
+                                            for m in range(s)]) \
+                         for j in range(n)]
+                k.append(derivative(inputs[s-1], stage))
+            
+            x_new = [x[j] + step * sum([_dp_b[m] * k[m][j] \
+                                        for m in range(6)]) \
+                     for j in range(n)]
+            k.append(derivative(inputs[5], x_new))
+            evaluations += 6
+            
+            error = 0.0
+            for j in range(n):
+                err = step * sum([_dp_e[m] * k[m][j] for m in range(7)])
+                scale = atol + rtol * max(abs(x[j]), abs(x_new[j]))
+                error += (err / scale) ** 2
+            error = (error / max(n, 1)) ** 0.5
+            
+            if error > 1.0:
+                rejected += 1
+                step *= max(0.2, 0.9 * error ** -0.2)
+                continue
+            
+            accepted += 1
+            if shortest is None or step < shortest:
+                shortest = step
+            if longest is None or step > longest:
+                longest = step
+            
+            # dense output on the sample times inside the step
+            q = [[sum([k[m][j] * _dp_p[m][p] for m in range(7)]) \
+                  for p in range(4)] for j in range(n)]
+            while i <= samples and \
+                  sample_time * i <= time + step + 1e-12 * end:
+                theta = (sample_time * i - time) / step
+                powers = [theta, theta ** 2, theta ** 3, theta ** 4]
+                state = [x[j] + step * sum([q[j][p] * powers[p] \
+                                            for p in range(4)]) \
+                         for j in range(n)]
+                append(delayed(output(sample_time * i, state)))
+                i += 1
+            
+            x = x_new
+            k1 = k[6]
+            
+            if step >= limit - time:
+                # the step ended at a change of the input
+                time = limit
+                if limits:
+                    limit = limits.pop()
+                    value = u(time)
+                    k1 = derivative(value, x)
+                    evaluations += 1
+            else:
+                time += step
+            
+            if error == 0:
+                step *= 10.0
+            else:
+                step *= min(10.0, 0.9 * error ** -0.2)
+    finally:
+        if sink is not None:
+            writer.finish()
+    
+    if prof is not None:
+        prof.stop('step', start, samples+1)
+    
+    if stats is not None:
+        stats.update({
+            'accepted': accepted,
+            'rejected': rejected,
+            'evaluations': evaluations,
+            'min_step': shortest,
+            'max_step': longest,
+        })
+    
+    if sink is not None:
+        return writer.close()
+    
+    return SimulationResult(y, sample_time)
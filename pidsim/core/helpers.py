@@ -9,7 +9,16 @@
     :license: GPL-2, see LICENSE for more details.
 """
 
-__all__ = ['get_time_near']
+__all__ = ['get_time_near', 'ResponseIndex', 'step_metrics', 'LRUCache',
+           'DelayLine']
+
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from pidsim.core.error import ControlSystemsError
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
 
 
 def get_time_near(t, y, point):
@@ -30,4 +39,278 @@ def get_time_near(t, y, point):
             my_t = t[i]
             tolerance_range = tolerance
     
-    return my_t
\ No newline at end of file
+    return my_t
+
+
+class ResponseIndex(object):
+    """Response index
+    
+    Index of the points (t, y) of a response, built once, that answers
+    the same queries of 'get_time_near' by bisection. For example::
+    
+        >>> index = ResponseIndex(t, y)
+        >>> index.time_near(0.5)
+        (returns the same of get_time_near(t, y, 0.5))
+        >>> index.times_near([0.25, 0.5, 0.75])
+        (returns a list with the times of the 3 points)
+    
+    The queries are answered on the monotone prefix of 'y' (the reaction
+    curve until its first peak), unless a later point may be nearer.
+    Then, a sorted index of all the points is built, once.
+    
+    """
+    
+    def __init__(self, t, y):
+        self.t = t
+        self.y = y
+        
+        n = len(y)
+        
+        # direction of the monotone prefix: 1 if non-decreasing, -1 if
+        # non-increasing
+        self._sign = 1
+        for i in range(1, n):
+            if y[i] != y[0]:
+                if y[i] < y[0]:
+                    self._sign = -1
+                break
+        
+        sign = self._sign
+        end = 1
+        while end < n and sign * y[end] >= sign * y[end - 1]:
+            end += 1
+        
+        self._prefix = [sign * x for x in y[:end]]
+        
+        if end < n:
+            rest = y[end:]
+            self._rest = min(rest), max(rest)
+        else:
+            self._rest = None
+        
+        self._sorted = None
+    
+    def _prefix_near(self, point):
+        """Returns the index of the point of the prefix more near of
+        'point', and its distance"""
+        
+        values = self._prefix
+        target = self._sign * point
+        pos = bisect_left(values, target)
+        
+        if pos == len(values):
+            i = bisect_left(values, values[-1])
+        elif pos == 0 or values[pos] - target < target - values[pos - 1]:
+            i = pos
+        else:
+            i = bisect_left(values, values[pos - 1])
+        
+        return i, abs(values[i] - target)
+    
+    def _sorted_near(self, point):
+        """Returns the index of the first point more near of 'point',
+        using the sorted index"""
+        
+        if self._sorted is None:
+            pairs = sorted([(self.y[i], i) for i in range(len(self.y))])
+            self._sorted = [x for x, i in pairs], [i for x, i in pairs]
+        
+        values, indexes = self._sorted
+        pos = bisect_left(values, point)
+        
+        candidates = []
+        if pos < len(values):
+            candidates.append((values[pos] - point, indexes[pos]))
+        if pos > 0:
+            first = bisect_left(values, values[pos - 1])
+            candidates.append((point - values[first], indexes[first]))
+        
+        return min(candidates)[1]
+    
+    def index_near(self, point):
+        """Returns the index of the first point of 'y' more near of the
+        desired point 'point'"""
+        
+        i, distance = self._prefix_near(point)
+        
+        if self._rest is not None and distance > 0:
+            low, high = self._rest
+            if low < point + distance and high > point - distance:
+                return self._sorted_near(point)
+        
+        return i
+    
+    def time_near(self, point):
+        """Returns the time 't' of the point 'y' more near of the desired
+        point 'point'"""
+        
+        return self.t[self.index_near(point)]
+    
+    def times_near(self, points):
+        """Returns a list with the times 't' of the points 'y' more near
+        of each desired point of 'points'"""
+        
+        return [self.t[self.index_near(point)] for point in points]
+
+
+def step_metrics(t, y, reference=1.0, tolerance=0.02):
+    """Step response metrics
+    
+    Returns a dict with the metrics of the step response (t, y) to the
+    reference 'reference':
+    
+    - 'overshoot': maximum overshoot, in percents of the final value;
+    - 'rise_time': time to rise from 10% to 90% of the final value;
+    - 'settling_time': time to stay within 'tolerance' of the final value;
+    - 'steady_state_error': error between the reference and the final
+      value;
+    - 'iae': integral of the absolute error.
+    
+    """
+    
+    final = y[-1]
+    peak = max(y)
+    
+    if final != 0:
+        overshoot = max(0.0, 100.0 * (peak - final) / final)
+    else:
+        overshoot = 0.0
+    
+    t10 = t90 = None
+    for i in range(len(y)):
+        if t10 is None and y[i] >= 0.1 * final:
+            t10 = t[i]
+        if y[i] >= 0.9 * final:
+            t90 = t[i]
+            break
+    
+    if t10 is None or t90 is None:
+        rise_time = None
+    else:
+        rise_time = t90 - t10
+    
+    settling_time = t[0]
+    band = abs(tolerance * final)
+    for i in range(len(y) - 1, -1, -1):
+        if abs(y[i] - final) > band:
+            settling_time = t[min(i + 1, len(t) - 1)]
+            break
+    
+    iae = 0.0
+    for i in range(1, len(y)):
+        iae += abs(reference - y[i]) * (t[i] - t[i - 1])
+    
+    return {
+        'overshoot': overshoot,
+        'rise_time': rise_time,
+        'settling_time': settling_time,
+        'steady_state_error': reference - final,
+        'iae': iae,
+    }
+
+
+class LRUCache(object):
+    """Least recently used cache
+    
+    A dict-like cache that stores up to 'maxsize' items, discarding the
+    least recently used items first, and counts hits and misses. For
+    example::
+    
+        >>> cache = LRUCache(2)
+        >>> cache['a'] = 1
+        >>> cache.get('a')
+        1
+        >>> cache.get('b')
+        >>> cache.info()
+        CacheInfo(hits=1, misses=1, maxsize=2, currsize=1)
+    
+    """
+    
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __contains__(self, key):
+        return key in self._items
+    
+    def __setitem__(self, key, value):
+        if key in self._items:
+            del self._items[key]
+        elif len(self._items) >= self.maxsize:
+            self._items.popitem(last=False)
+        if self.maxsize > 0:
+            self._items[key] = value
+    
+    def get(self, key, default=None):
+        """Returns the value of 'key' and marks it as recently used, or
+        'default' if it isn't cached"""
+        
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        
+        self._items[key] = value
+        self.hits += 1
+        return value
+    
+    def clear(self):
+        """Removes all the items and resets the statistics"""
+        
+        self._items.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def info(self):
+        """Returns the statistics of the cache"""
+        
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._items))
+
+
+class DelayLine(object):
+    """Delay line
+    
+    A fixed-size circular buffer that delays a sampled signal by 'delay'
+    samples. Integer delays are exact; the fractional part of the delay
+    is linearly interpolated between 2 samples. For example::
+    
+        >>> line = DelayLine(2)
+        >>> [line.push(x) for x in [1, 2, 3, 4]]
+        [0.0, 0.0, 1.0, 2.0]
+    
+    The output before the first delayed sample is 'initial'.
+    
+    """
+    
+    def __init__(self, delay, initial=0.0):
+        if delay < 0:
+            raise ControlSystemsError('Delay must be non-negative')
+        self.whole = int(delay)
+        self.fraction = delay - self.whole
+        self._size = self.whole + 2
+        self._buffer = [float(initial)] * self._size
+        self._pos = 0
+    
+    def push(self, value):
+        """Stores the sample 'value' and returns the delayed sample"""
+        
+        buf = self._buffer
+        pos = self._pos
+        size = self._size
+        
+        buf[pos] = float(value)
+        
+        res = buf[(pos - self.whole) % size]
+        if self.fraction:
+            res += self.fraction * (buf[(pos - self.whole - 1) % size] - res)
+        
+        self._pos = (pos + 1) % size
+        
+        return res
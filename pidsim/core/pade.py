@@ -13,6 +13,7 @@
 """
 
 __all__ = [
+    'pade',
     'Pade1',
     'Pade2',
     'Pade3',
@@ -20,58 +21,147 @@ __all__ = [
     'Pade5',
 ]
 
-from pidsim.core.types import poly, tf
+from pidsim.core.error import ControlSystemsError
+from pidsim.core.types import tf
+
+# normalized coefficients of each order, see _coefficients
+coefficients = {}
+
+# largest order whose normalized coefficients fit in a float
+max_order = 134
+
+
+def _coefficients(n):
+    """Normalized coefficients
+    
+    Returns the coefficients r[k], from k = n down to 0, of the
+    denominator of the Pade approximation of order 'n', divided by the
+    leading coefficient::
+    
+        r[k] = (2n - k)! / (k! (n - k)!)
+    
+    The values are computed with the recurrence
+    r[k-1] = r[k] * k * (2n - k + 1) / (n - k + 1), in integer
+    arithmetic, and cached by order.
+    
+    """
+    
+    try:
+        return coefficients[n]
+    except KeyError:
+        pass
+    
+    r = [1]
+    for k in range(n, 0, -1):
+        r.append(r[-1] * k * (2*n - k + 1) // (n - k + 1))
+    
+    coefficients[n] = r = [float(a) for a in r]
+    return r
+
+
+def pade(t, n):
+    """Pade approximation
+    
+    Returns the transfer function of the Pade approximation of order 'n'
+    of the transport delay of 't' seconds, with monic denominator. For
+    example::
+    
+        >>> print pade(0.5, 2)
+        Transfer Function:
+        
+        s^2 - 12s + 48
+        --------------
+        s^2 + 12s + 48
+    
+    The normalized coefficients of each order are cached, then repeated
+    calls with different delays only scale them by powers of 1/t.
+    
+    The order must be between 1 and 'max_order' (134): the constant
+    coefficient of the monic denominator, (2n)!/(n! t^n), doesn't fit in
+    a float for larger orders. Very short or very long delays reduce the
+    usable orders further, as t^n overflows or underflows; a
+    ControlSystemsError is raised in these cases.
+    
+    """
+    
+    if int(n) != n or not 1 <= n <= max_order:
+        raise ControlSystemsError('Invalid order: %r (must be an integer '
+                                  'between 1 and %i)' % (n, max_order))
+    
+    if not t > 0:
+        raise ControlSystemsError('Invalid delay: %r (must be positive)' % t)
+    
+    r = _coefficients(int(n))
+    
+    num = []
+    den = []
+    scale = 1.0
+    sign = 1 - 2 * (int(n) % 2)
+    
+    for a in r:
+        den.append(a * scale)
+        num.append(sign * a * scale)
+        scale /= t
+        sign = -sign
+    
+    # all the coefficients are nonzero, then zeros are underflows
+    for a in den:
+        if a == 0 or a == float('inf'):
+            raise ControlSystemsError('The coefficients of the order %i '
+                                      'for the delay %r are out of the '
+                                      'floating point range' % (n, t))
+    
+    return tf(num, den)
+
 
 def Pade1(t):
     """First order Pade approximation"""
     
-    num = poly([-t, 2])
-    den = poly([t, 2])
-    num = num.mult(1.0/den[0])
-    den = den.mult(1.0/den[0])
-    return tf(num, den)
+    return pade(t, 1)
 
 
 def Pade2(t):
     """Second order Pade approximation"""
-    num = poly([t*t, -6*t, 12])
-    den = poly([t*t, 6*t, 12])
-    num = num.mult(1.0/den[0])
-    den = den.mult(1.0/den[0])
-    return tf(num, den)
+    
+    return pade(t, 2)
 
 
 def Pade3(t):
     """Third order Pade approximation"""
-    num = poly([-t*t*t, 12*t*t, -60*t, 120])
-    den = poly([t*t*t, 12*t*t, 60*t, 120])
-    num = num.mult(1.0/den[0])
-    den = den.mult(1.0/den[0])
-    return tf(num, den)
+    
+    return pade(t, 3)
 
 
 def Pade4(t):
     """Fourth order Pade approximation"""
-    num = poly([t*t*t*t, -20*t*t*t, 180*t*t, -840*t, 1680])
-    den = poly([t*t*t*t, 20*t*t*t, 180*t*t, 840*t, 1680])
-    num = num.mult(1.0/den[0])
-    den = den.mult(1.0/den[0])
-    return tf(num, den)
+    
+    return pade(t, 4)
 
 
 def Pade5(t):
     """Fifth order Pade approximation"""
-    num = poly([-t*t*t*t*t, 30*t*t*t*t, -420*t*t*t, 3360*t*t, -15120*t, 30240])
-    den = poly([t*t*t*t*t, 30*t*t*t*t, 420*t*t*t, 3360*t*t, 15120*t, 30240])
-    num = num.mult(1.0/den[0])
-    den = den.mult(1.0/den[0])
-    return tf(num, den)
+    
+    return pade(t, 5)
+
+
+class _Index(dict):
+    """Index of the Pade approximations by order
+    
+    The orders without a named function are built on demand, using
+    pade().
+    
+    """
+    
+    def __missing__(self, n):
+        if not isinstance(n, (int, long)) or n < 1:
+            raise KeyError(n)
+        return lambda t: pade(t, n)
 
 
-index = {
+index = _Index({
     1: Pade1,
     2: Pade2,
     3: Pade3,
     4: Pade4,
     5: Pade5,
-}
+})
@@ -12,8 +12,9 @@
     :license: GPL-2, see LICENSE for more details.
 """
 
-__all__ = ['identification', 'tuning']
+__all__ = ['identification', 'sweep', 'tuning']
 
 
 import identification
+import sweep
 import tuning
\ No newline at end of file
@@ -13,9 +13,22 @@
     :license: GPL-2, see LICENSE for more details.
 """
 
-__all__ = ['Alfaro', 'Broida', 'ChenYang', 'Ho', 'Smith', 'Viteckova']
+__all__ = ['Alfaro', 'Broida', 'ChenYang', 'Ho', 'Smith', 'Viteckova',
+           'JahanmiriFallahi', 'identify']
 
-from pidsim.core.helpers import get_time_near
+from pidsim.core.helpers import ResponseIndex
+
+
+def _percents(method):
+    """Returns the list of points (in percents) of the identification
+    method 'method' (a class or an instance)"""
+    
+    percents = []
+    for name in ('point1', 'point2', 'point3'):
+        percent = getattr(method, name, None)
+        if percent is not None:
+            percents.append(percent)
+    return percents
 
 
 class IdentificationMethod:
@@ -23,21 +36,22 @@ class IdentificationMethod:
     point1 = None # in percents
     point2 = None # in percents
     
-    def __init__(self, t, y):
+    def __init__(self, t, y, index=None):
         self.t = t
         self.y = y
+        self.index = index
     
     @property
     def points(self):
         if self.point1 is None or self.point2 is None:
             raise NotImplementedError('You need shouldn\'t instance this ' \
                                       'class directly')
+        if self.index is None:
+            self.index = ResponseIndex(self.t, self.y)
         k = self.y[-1]
-        y1 = (float(self.point1)/100) * k
-        y2 = (float(self.point2)/100) * k
-        t1 = get_time_near(self.t, self.y, y1)
-        t2 = get_time_near(self.t, self.y, y2)
-        return (t1, y1), (t2, y2)
+        values = [(float(percent)/100) * k for percent in _percents(self)]
+        times = self.index.times_near(values)
+        return tuple(zip(times, values))
     
     @property
     def tuning_line(self):
@@ -84,21 +98,53 @@ class JahanmiriFallahi(IdentificationMethod):
     point2 = 70.0
     point3 = 90.0
     
-    @property
-    def points(self):
-        k = self.y[-1]
-        y3 = (float(self.point3)/100) * k
-        t3 = get_time_near(self.t, self.y, y3)
-        a, b = IdentificationMethod.points(self)
-        return a, b, (t3, y3)
-    
     @property
     def tuning_line(self):
         # XXX: this method is wrong
-        (t1, y1), (t2, y2) = self.points
+        (t1, y1), (t2, y2) = self.points[:2]
         alpha = (t2 - t1)/(y2 - y1)
         yp = max(self.y)
         t0 = t1 - (y1 * alpha)
         tp = t2 + ((yp - y2) * alpha)
         return [t0, t1, t2, tp], [0, y1, y2, yp]
+
+
+methods = [Alfaro, Broida, ChenYang, Ho, Smith, Viteckova, JahanmiriFallahi]
+
+
+def identify(t, y, methods=methods):
+    """Multi-method identification
+    
+    Returns a dict with the points of each identification method of the
+    list 'methods' (all the methods, by default) for the reaction curve
+    (t, y), keyed by the name of the method. The union of the points of
+    all the methods is resolved at once, over a single index of the
+    curve. For example::
+    
+        >>> g = TransferFunction([1], [1, 3, 3, 1])
+        >>> t, y = RungeKutta4(g, 0.01, 20)
+        >>> points = identify(t, y)
+        >>> points['Alfaro']
+        (returns the same of Alfaro(t, y).points)
+    
+    """
+    
+    index = ResponseIndex(t, y)
+    k = y[-1]
+    
+    percents = []
+    for method in methods:
+        for percent in _percents(method):
+            if percent not in percents:
+                percents.append(percent)
+    
+    values = [(float(percent)/100) * k for percent in percents]
+    times = dict(zip(percents, index.times_near(values)))
+    
+    results = {}
+    for method in methods:
+        results[method.__name__] = tuple([(times[percent],
+                                           (float(percent)/100) * k) \
+                                          for percent in _percents(method)])
     
+    return results
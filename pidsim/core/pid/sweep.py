@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+    pidsim.core.pid.sweep
+    ~~~~~~~~~~~~~~~~~~~~~
+    
+    PID Controller gain sweeps.
+    
+    This module implements the simulation of the closed loop of a plant
+    and a PID controller for a grid of gains, distributed over a pool of
+    processes. Only the metrics of each step response are returned to
+    the caller, not the full traces.
+    
+    :copyright: 2009-2010 by Rafael Goncalves Martins
+    :license: GPL-2, see LICENSE for more details.
+"""
+
+__all__ = ['controller', 'sweep']
+
+import inspect
+import itertools
+import multiprocessing
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+from pidsim.core import discretization
+from pidsim.core.error import ControlSystemsError
+from pidsim.core.helpers import step_metrics
+from pidsim.core.types import TransferFunction
+
+
+def controller(kp, ki, kd):
+    """PID Controller
+    
+    Returns the transfer function of the PID controller with the gains
+    'kp', 'ki' and 'kd'::
+    
+        C(s) = (kd*s^2 + kp*s + ki) / s
+    
+    """
+    
+    return TransferFunction([kd, kp, ki], [1, 0])
+
+
+def _evaluate(args):
+    """Worker function
+    
+    Returns the list of (kp, ki, kd, metrics) of a chunk of gains. This
+    function runs on the worker processes, then it must be on the module
+    level, to be pickled.
+    
+    """
+    
+    g, chunk, sample_time, total_time, method = args
+    
+    results = []
+    
+    for kp, ki, kd in chunk:
+        closed = (controller(kp, ki, kd) * g).feedback_unit()
+        t, y = getattr(discretization, method)(closed, sample_time,
+                                               total_time)
+        results.append((kp, ki, kd, step_metrics(t, y)))
+    
+    return results
+
+
+def _pool_map(func, iterable, workers):
+    """Maps 'func' over 'iterable' using a pool of 'workers' processes"""
+    
+    if ProcessPoolExecutor is not None:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            return list(executor.map(func, iterable))
+        finally:
+            executor.shutdown()
+    
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(func, iterable)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def sweep(g, kp, ki, kd, sample_time, total_time, method='RungeKutta4',
+          workers=None, chunksize=None):
+    """PID gain sweep
+    
+    Returns a list of (kp, ki, kd, metrics) with the metrics (see
+    pidsim.core.helpers.step_metrics) of the step response of the unit
+    feedback closed loop of the plant 'g' and a PID controller, for each
+    point of the grid of gains 'kp' x 'ki' x 'kd', discretized with the
+    numerical method 'method'. For example::
+    
+        >>> g = TransferFunction([1], [1, 3, 3, 1])
+        >>> for kp, ki, kd, metrics in sweep(g, [1, 2], [0.5], [0, 1],
+        ...                                  0.01, 20):
+        ...     print kp, ki, kd, metrics['overshoot']
+        ...
+        (prints the overshoot of the 4 points of the grid)
+    
+    The grid is split in chunks of 'chunksize' points, distributed over
+    'workers' processes (the number of CPUs, by default). With
+    'workers=1' the sweep runs on the current process.
+    
+    """
+    
+    if not isinstance(g, TransferFunction):
+        raise ControlSystemsError('Parameter must be a Transfer Fcn.')
+    
+    # fail early, on the current process, if the method is invalid. Only
+    # the fixed-step methods are built on compile_stepper.
+    if method in discretization.tableaus or \
+       method in discretization.operators:
+        discretization.compile_stepper(g, method, sample_time)
+    elif method not in discretization.__all__ or \
+         inspect.getargspec(getattr(discretization, method)).args[:3] != \
+         ['g', 'sample_time', 'total_time']:
+        raise ControlSystemsError('Invalid method: %s' % method)
+    
+    grid = list(itertools.product(kp, ki, kd))
+    
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    
+    if chunksize is None:
+        chunksize = max(1, len(grid) // (workers * 4))
+    
+    chunks = [(g, grid[i:i + chunksize], sample_time, total_time, method) \
+              for i in range(0, len(grid), chunksize)]
+    
+    if workers == 1:
+        results = map(_evaluate, chunks)
+    else:
+        results = _pool_map(_evaluate, chunks, workers)
+    
+    return [point for chunk in results for point in chunk]
@@ -32,23 +32,46 @@ class TuningMethod:
     def __init__(self, t, y, i_method):
         self.t = t
         self.y = y
-        self.k = y[-1]
-        self.ident = i_method(t, y)
+        self.i_method = i_method
+        self.invalidate()
+    
+    def invalidate(self):
+        """Discards the cached quantities. Call it if 't' or 'y' change."""
+        self.k = self.y[-1]
+        self.ident = self.i_method(self.t, self.y)
+        self._cache = {}
+    
+    def _cached(self, name, function):
+        """Returns the cached value of 'name', computed by 'function' on
+        the first use"""
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = function()
+            return value
+    
+    @property
+    def points(self):
+        return self._cached('points', lambda: self.ident.points)
     
     @property
     def times(self):
-        p1, p2 = self.ident.points
+        p1, p2 = self.points[:2]
         return p1[0], p2[0]
     
     @property
     def tau(self):
-        t1, t2 = self.times
-        return 1.5 * (t2 - t1)
+        def tau():
+            t1, t2 = self.times
+            return 1.5 * (t2 - t1)
+        return self._cached('tau', tau)
     
     @property
     def Tm(self):
-        t1, t2 = self.times
-        return 1.5 * (t1 - (t2 / 3))
+        def Tm():
+            t1, t2 = self.times
+            return 1.5 * (t1 - (t2 / 3))
+        return self._cached('Tm', Tm)
     
     @property
     def gains(self):
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+    pidsim.core.pid_simulation
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+    
+    Closed-loop PID simulation.
+    
+    This module implements the simulation of the unit feedback closed loop
+    of a plant and a discrete PID controller. The state of the plant and
+    the PID law are stepped together, then the controller can have
+    nonlinear features (output limits and anti-windup) that can't be
+    modeled by the multiplication of transfer functions.
+    
+    :copyright: 2009-2010 by Rafael Goncalves Martins
+    :license: GPL-2, see LICENSE for more details.
+"""
+
+__all__ = ['simulate']
+
+from pidsim.core import discretization
+from pidsim.core.discretization import compile_stepper, prepare_stepper
+from pidsim.core.helpers import DelayLine
+from pidsim.core.types import TimeAxis
+
+
+def simulate(g, kp, ki, kd, sample_time, total_time, setpoint=1.0,
+             method='ZOH', derivative_filter=10.0, output_limits=(None, None),
+             antiwindup=True, delay=0.0):
+    """Closed-loop PID simulation
+    
+    Returns the points (t, y, u, e) of the response of the unit feedback
+    closed loop of the plant 'g' and a PID controller with the gains
+    'kp', 'ki' and 'kd' to the setpoint 'setpoint', where 'y' is the
+    output of the plant, 'u' is the control effort and 'e' is the error.
+    The plant is discretized with the numerical method 'method', using
+    the sample time 'sample_time' on 'total_time' seconds. For example::
+    
+        >>> g = TransferFunction([1], [1, 3, 3, 1])
+        >>> t, y, u, e = simulate(g, 2, 0.5, 1, 0.01, 20,
+        ...                       output_limits=(0, 5))
+        >>> print y
+        (prints a vector of points, with the same size of 't')
+    
+    The PID law is, at each sample::
+    
+        u = kp*e + ki*integral(e) + kd*derivative(e)
+    
+    where the derivative is filtered by a first order low-pass filter
+    with time constant kd/(kp*derivative_filter) (no filter if
+    'derivative_filter' is None), and 'u' is clamped to 'output_limits'
+    (a tuple (min, max), where None means no limit). If 'antiwindup' is
+    True, the integral isn't updated while the output is saturated in the
+    direction of the error.
+    
+    The control effort is held constant between the samples. If the
+    plant isn't strictly proper, its output uses the control effort of
+    the previous sample, to avoid an algebraic loop.
+    
+    The control effort reaches the plant after a transport delay of
+    'delay' seconds, implemented by a circular buffer (see
+    pidsim.core.helpers.DelayLine) instead of Pade approximations.
+    
+    """
+    
+    phi, gamma, c, d = compile_stepper(g, method, sample_time)
+    
+    prof = discretization.profiler
+    if prof is not None:
+        start = prof.start()
+    
+    dot, scale, x, phi, gamma, c, d = prepare_stepper(phi, gamma, c, d)
+    
+    samples = int(total_time/sample_time)
+    
+    t = TimeAxis(0.0, sample_time, samples+1)
+    y = [0.0] * (samples+1)
+    u = [0.0] * (samples+1)
+    e = [0.0] * (samples+1)
+    
+    u_min, u_max = output_limits
+    
+    if derivative_filter is None or kp == 0:
+        filter_time = 0.0
+    else:
+        filter_time = float(kd) / (kp * derivative_filter)
+    
+    # coefficients of the backward Euler discretization of the filtered
+    # derivative kd*s/(filter_time*s + 1)
+    d_old = filter_time / (filter_time + sample_time)
+    d_gain = kd / (filter_time + sample_time)
+    i_gain = ki * sample_time
+    
+    if delay:
+        push = DelayLine(float(delay) / sample_time).push
+    else:
+        push = float
+    
+    integral = 0.0
+    derivative = 0.0
+    error_old = 0.0
+    delayed = 0.0
+    
+    for i in range(samples+1):
+    
+        output = float(dot(c, x)[0][0] + d * delayed)
+        error = setpoint - output
+        
+        derivative = d_old * derivative + d_gain * (error - error_old)
+        integral_new = integral + i_gain * error
+        
+        control = kp * error + integral_new + derivative
+        
+        if u_max is not None and control > u_max:
+            control = u_max
+            saturated = error > 0
+        elif u_min is not None and control < u_min:
+            control = u_min
+            saturated = error < 0
+        else:
+            saturated = False
+        
+        if not (antiwindup and saturated):
+            integral = integral_new
+        
+        error_old = error
+        
+        y[i] = output
+        u[i] = control
+        e[i] = error
+        
+        delayed = push(control)
+        x = dot(phi, x) + scale(gamma, delayed)
+    
+    if prof is not None:
+        prof.stop('step', start, samples+1)
+    
+    return t, y, u, e
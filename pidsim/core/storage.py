@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+    pidsim.core.storage
+    ~~~~~~~~~~~~~~~~~~~
+    
+    Binary storage of simulation results and models.
+    
+    This module implements a compact binary file format for the output
+    of the simulations and for the TransferFunction and StateSpace
+    models, readable without unpickling. The output of a simulation can
+    be written in chunks while the simulation runs and read back through
+    a memory map, then its size is bounded by the disk instead of the
+    memory. For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> result = RungeKutta4(g, 0.001, 86400, sink='output.bin')
+        >>> result.y[-1]
+        (reads the last point from the file)
+        >>> result.close()
+        >>> result = MappedResult('output.bin')
+    
+    Results and models are saved and loaded with save() and load()::
+    
+        >>> save('plant.bin', TransferFunction([1], [1, 2, 3]))
+        >>> g = load('plant.bin')
+        >>> save('response.bin', RungeKutta4(g, 0.01, 10), compress=True)
+    
+    The file (version 1) is little-endian, with a header of 40 bytes::
+    
+        offset  type     field
+        0       char[8]  magic: '\\x89PIDSIM\\n'
+        8       uint16   version
+        10      uint16   kind: 1 (result), 2 (transfer function) or
+                         3 (state-space)
+        12      uint32   flags: 1 if the values are compressed with zlib
+        16      float64  start: time of the first sample (results only)
+        24      float64  step: sample time (results only)
+        32      uint64   count: number of float64 values
+    
+    followed by the shapes of the models (uint64 values: the lengths of
+    the numerator and the denominator of transfer functions, or the rows
+    and columns of the matrices A, B, C and D of state-space models) and
+    by 'count' float64 values: the points of the output of results, or
+    the coefficients of the polynomials or matrices (row by row) of
+    models. Compressed values are a single zlib stream, until the end of
+    the file, and can't be memory-mapped.
+    
+    :copyright: 2009-2010 by Rafael Goncalves Martins
+    :license: GPL-2, see LICENSE for more details.
+"""
+
+__all__ = ['ResultWriter', 'MappedArray', 'MappedResult', 'save', 'load']
+
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from pidsim.core.error import ControlSystemsError
+from pidsim.core.types import Matrix, TransferFunction, StateSpace, \
+    TimeAxis, SimulationResult, numpy
+
+magic = '\x89PIDSIM\n'
+version = 1
+
+KIND_RESULT = 1
+KIND_TRANSFER_FUNCTION = 2
+KIND_STATE_SPACE = 3
+
+FLAG_ZLIB = 1
+
+header = struct.Struct('<8sHHIddQ')
+
+# shapes of the models, after the header
+shapes = {
+    KIND_RESULT: struct.Struct('<'),
+    KIND_TRANSFER_FUNCTION: struct.Struct('<2Q'),
+    KIND_STATE_SPACE: struct.Struct('<8Q'),
+}
+
+# number of samples buffered before each write
+chunk_size = 65536
+
+
+def _little_endian(values):
+    """Returns the array('d') 'values' in little-endian byte order"""
+    
+    if sys.byteorder == 'big':
+        values = array('d', values)
+        values.byteswap()
+    return values
+
+
+def _read_header(fp):
+    """Reads and validates the header of the file object 'fp'. Returns
+    the fields (kind, flags, start, step, count)."""
+    
+    data = fp.read(header.size)
+    if len(data) != header.size or data[:len(magic)] != magic:
+        raise ControlSystemsError('Invalid file: %s' % fp.name)
+    
+    _magic, _version, kind, flags, start, step, count = \
+        header.unpack(data)
+    
+    if _version > version:
+        raise ControlSystemsError('Unsupported file version: %i' % _version)
+    if kind not in shapes:
+        raise ControlSystemsError('Invalid file kind: %i' % kind)
+    
+    return kind, flags, start, step, count
+
+
+class ResultWriter(object):
+    """Writer of simulation results
+    
+    Writes the points of a simulation sampled each 'sample_time' seconds
+    from the time 'start' to the file 'filename', in chunks of
+    'chunk_size' samples (a module variable). The method close()
+    finishes the file and returns a MappedResult to read it. If the
+    simulation fails, call finish() instead, to keep the points already
+    written. For example::
+    
+        >>> writer = ResultWriter('output.bin', 0.01)
+        >>> for value in values:
+        ...     writer.append(value)
+        ...
+        >>> result = writer.close()
+    
+    """
+    
+    def __init__(self, filename, sample_time, start=0.0):
+        self.filename = filename
+        self.sample_time = float(sample_time)
+        self.start = float(start)
+        self.count = 0
+        self._chunk = array('d')
+        self._fp = open(filename, 'w+b')
+        self._write_header()
+    
+    def _write_header(self):
+        self._fp.seek(0)
+        self._fp.write(header.pack(magic, version, KIND_RESULT, 0,
+                                   self.start, self.sample_time, self.count))
+    
+    def append(self, value):
+        """Appends the point 'value' to the output"""
+        
+        self._chunk.append(value)
+        if len(self._chunk) >= chunk_size:
+            self.flush()
+    
+    def extend(self, values):
+        """Appends the points 'values' to the output"""
+        
+        for value in values:
+            self.append(value)
+    
+    def flush(self):
+        """Writes the buffered points to the file"""
+        
+        if not self._chunk:
+            return
+        self._fp.seek(0, 2)
+        _little_endian(self._chunk).tofile(self._fp)
+        self.count += len(self._chunk)
+        del self._chunk[:]
+    
+    def finish(self):
+        """Writes the buffered points and the final header, and closes
+        the file. The points written before an error are kept readable.
+        Does nothing if the file is already closed."""
+        
+        if self._fp.closed:
+            return
+        try:
+            self.flush()
+            self._write_header()
+        finally:
+            self._fp.close()
+    
+    def close(self):
+        """Finishes the file and returns a MappedResult to read it"""
+        
+        self.finish()
+        return MappedResult(self.filename)
+
+
+class MappedArray(object):
+    """Read-only sequence of float64 values
+    
+    This class implements a sequence of the 'count' little-endian
+    float64 values stored at the offset 'offset' of the memory map 'mm'.
+    The values are unpacked on demand, and slices return array('d')
+    objects.
+    
+    """
+    
+    def __init__(self, mm, offset, count):
+        self._mm = mm
+        self._offset = offset
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            first, last, stride = key.indices(self.count)
+            if stride > 0:
+                if last <= first:
+                    return array('d')
+                return self._read(first, last)[::stride]
+            if last >= first:
+                return array('d')
+            return self._read(last + 1, first + 1)[::-1][::-stride]
+        
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError('MappedArray index out of range')
+        
+        return struct.unpack_from('<d', self._mm, self._offset + 8 * key)[0]
+    
+    def __iter__(self):
+        for first in xrange(0, self.count, chunk_size):
+            for value in self._read(first, min(first + chunk_size,
+                                               self.count)):
+                yield value
+    
+    def __repr__(self):
+        return '<MappedArray: %i values>' % self.count
+    
+    def _read(self, first, last):
+        """Returns the values [first, last) as an array('d')"""
+        
+        values = array('d')
+        values.fromstring(self._mm[self._offset + 8 * first:
+                                   self._offset + 8 * last])
+        return _little_endian(values)
+    
+    def buffer(self):
+        """Returns a read-only buffer with the values, sharing the memory
+        map"""
+        
+        return buffer(self._mm, self._offset, 8 * self.count)
+
+
+class MappedResult(SimulationResult):
+    """Memory-mapped simulation result
+    
+    This class implements a SimulationResult read from the file
+    'filename' (see ResultWriter) through a memory map. The points of
+    'y' are read on demand, then the file may be larger than the memory.
+    Call close() to release the file.
+    
+    """
+    
+    __slots__ = ('filename', '_fp', '_mm')
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self._fp = open(filename, 'rb')
+        try:
+            kind, flags, start, step, count = _read_header(self._fp)
+            if kind != KIND_RESULT:
+                raise ControlSystemsError('Not a result: %s' % filename)
+            if flags & FLAG_ZLIB:
+                raise ControlSystemsError('Compressed file, use load(): '
+                                          '%s' % filename)
+            self._mm = mmap.mmap(self._fp.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except:
+            self._fp.close()
+            raise
+        
+        if len(self._mm) < header.size + 8 * count:
+            self.close()
+            raise ControlSystemsError('Truncated file: %s' % filename)
+        
+        self.t = TimeAxis(start, step, count)
+        self.y = MappedArray(self._mm, header.size, count)
+    
+    def __reduce__(self):
+        return self.__class__, (self.filename,)
+    
+    def __repr__(self):
+        return '<MappedResult: %s, %i samples, %r>' % (self.filename,
+                                                       len(self.y), self.t)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def close(self):
+        """Releases the memory map and the file"""
+        
+        self._mm.close()
+        self._fp.close()
+    
+    def buffer(self):
+        return self.y.buffer()
+    
+    def array(self):
+        if numpy is None:
+            raise ControlSystemsError('NumPy not available')
+        
+        return self.t.array(), numpy.frombuffer(self._mm, dtype='<f8',
+                                                count=len(self.y),
+                                                offset=header.size)
+
+
+def _matrix(values, rows, cols):
+    """Returns the Matrix of 'rows' x 'cols' of the flat 'values'"""
+    
+    return Matrix([values[i * cols:(i + 1) * cols].tolist() \
+                   for i in range(rows)])
+
+
+def _flatten(matrix):
+    """Returns the shape (rows, cols) and the values of a Matrix"""
+    
+    values = array('d')
+    for row in matrix:
+        values.extend(row)
+    return (matrix.rows, matrix.cols or 0), values
+
+
+def save(filename, obj, compress=False):
+    """Saves a result or model
+    
+    Saves the SimulationResult, TransferFunction or StateSpace object
+    'obj' to the file 'filename' (see the format on the documentation of
+    this module). If 'compress' is True, the values are compressed with
+    zlib, that is slower and can't be memory-mapped, but uses less disk
+    for smooth responses.
+    
+    """
+    
+    start = step = 0.0
+    
+    if isinstance(obj, SimulationResult):
+        kind = KIND_RESULT
+        dims = ()
+        start, step = obj.t.start, obj.t.step
+        if isinstance(obj, MappedResult):
+            values = obj.y[:]
+        else:
+            values = obj.y
+    elif isinstance(obj, TransferFunction):
+        kind = KIND_TRANSFER_FUNCTION
+        dims = (len(obj.num), len(obj.den))
+        values = array('d', obj.num) + array('d', obj.den)
+    elif isinstance(obj, StateSpace):
+        kind = KIND_STATE_SPACE
+        dims = ()
+        values = array('d')
+        for matrix in (obj.a, obj.b, obj.c, obj.d):
+            shape, flat = _flatten(matrix)
+            dims += shape
+            values.extend(flat)
+    else:
+        raise ControlSystemsError('Invalid object: %r' % obj)
+    
+    data = _little_endian(values).tostring()
+    flags = 0
+    if compress:
+        data = zlib.compress(data)
+        flags |= FLAG_ZLIB
+    
+    fp = open(filename, 'wb')
+    try:
+        fp.write(header.pack(magic, version, kind, flags, start, step,
+                             len(values)))
+        fp.write(shapes[kind].pack(*dims))
+        fp.write(data)
+    finally:
+        fp.close()
+
+
+def load(filename, mapped=True):
+    """Loads a result or model
+    
+    Returns the SimulationResult, TransferFunction or StateSpace object
+    saved to the file 'filename'. Uncompressed results are returned as
+    MappedResult objects, that read the file through a memory map, unless
+    'mapped' is False.
+    
+    """
+    
+    fp = open(filename, 'rb')
+    try:
+        kind, flags, start, step, count = _read_header(fp)
+        
+        if kind == KIND_RESULT and mapped and not flags & FLAG_ZLIB:
+            fp.close()
+            return MappedResult(filename)
+        
+        shape = shapes[kind]
+        dims = shape.unpack(fp.read(shape.size))
+        data = fp.read()
+    finally:
+        fp.close()
+    
+    if flags & FLAG_ZLIB:
+        data = zlib.decompress(data)
+    
+    if len(data) != 8 * count:
+        raise ControlSystemsError('Truncated file: %s' % filename)
+    
+    values = array('d')
+    values.fromstring(data)
+    values = _little_endian(values)
+    
+    if kind == KIND_RESULT:
+        return SimulationResult(values, step, start)
+    
+    if kind == KIND_TRANSFER_FUNCTION:
+        num, den = dims
+        return TransferFunction(values[:num], values[num:num + den])
+    
+    matrices = []
+    offset = 0
+    for i in range(0, 8, 2):
+        rows, cols = dims[i:i + 2]
+        matrices.append(_matrix(values[offset:], rows, cols))
+        offset += rows * cols
+    return StateSpace(*matrices)
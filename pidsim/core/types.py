@@ -20,16 +20,27 @@ __all__ = [
     'IdentityMatrix', 'eye',
     'TransferFunction', 'tf',
     'StateSpace', 'ss',
+    'TimeAxis', 'SimulationResult',
 ]
 
+import cmath
+from array import array
+
 from pidsim.core.error import ControlSystemsError
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
-class Polynomial(list):
+class Polynomial(array):
     """Polynomial type
     
-    This class implements the Polynomial type, based on the Python lists.
-    The Polynomial object is a list of coeficients. For example::
+    This class implements the Polynomial type, based on the Python arrays
+    of doubles. The Polynomial object is an array of coeficients, stored
+    contiguously, that supports the buffer protocol (e.g. it can be
+    handed to numpy.frombuffer() without copies). For example::
     
         >>> a = Polynomial([1, 2, 3])
         >>> print a
@@ -37,7 +48,115 @@ class Polynomial(list):
     
     """
     
-    var = 'x'
+    __slots__ = ('_var',)
+    
+    # Minimum size of the operands to multiply polynomials by FFT
+    fft_threshold = 128
+    
+    # Maximum ratio between the largest and the smallest nonzero
+    # coefficients of the operands to multiply polynomials by FFT
+    fft_dynamic_range = 1e6
+    
+    def __new__(cls, coefs=()):
+        """Creation of Polynomial object
+        
+        This method creates a Polynomial object, with the coefficients
+        of the iterable 'coefs' converted to floats.
+        
+        """
+        
+        if not isinstance(coefs, (array, list)):
+            coefs = list(coefs)
+        
+        return array.__new__(cls, 'd', coefs)
+    
+    
+    def __init__(self, coefs=()):
+        """Initialization of Polynomial object
+        
+        This method initialize a Polynomial object, with the variable 'x'.
+        
+        """
+        
+        self._var = 'x'
+    
+    
+    def _get_var(self):
+        return getattr(self, '_var', 'x')
+    
+    def _set_var(self, var):
+        self._var = var
+    
+    var = property(_get_var, _set_var)
+    
+    
+    def __reduce__(self):
+        """Pickle support"""
+        
+        return self.__class__, (self.tolist(),), self.var
+    
+    
+    def __setstate__(self, state):
+        """Pickle support"""
+        
+        self.var = state
+    
+    
+    def __copy__(self):
+        """Copy support"""
+        
+        res = Polynomial(self)
+        res.var = self.var
+        return res
+    
+    
+    def __deepcopy__(self, memo):
+        """Copy support"""
+        
+        return self.__copy__()
+    
+    
+    def __repr__(self):
+        """Representation of Polynomial object"""
+        
+        return 'Polynomial(%r)' % self.tolist()
+    
+    
+    def __eq__(self, other):
+        """Equality with polynomials and other sequences of numbers"""
+        
+        try:
+            return len(self) == len(other) and \
+                   all([x == y for x, y in zip(self, other)])
+        except TypeError:
+            return False
+    
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    
+    # polynomials are mutable, then they aren't hashable (see key)
+    __hash__ = None
+    
+    
+    def key(self):
+        """Immutable snapshot
+        
+        This method returns a tuple with the coefficients of the
+        Polynomial, hashable and equal for equal polynomials, to be used
+        as a key of dicts and caches instead of the Polynomial itself.
+        Later changes of the Polynomial don't change the snapshot. For
+        example::
+        
+            >>> a = Polynomial([1, 2, 3])
+            >>> a.key()
+            (1.0, 2.0, 3.0)
+        
+        """
+        
+        return tuple(self)
+    
     
     def __str__(self):
         """String representation
@@ -51,30 +170,30 @@ class Polynomial(list):
         
         #TODO: fix bug of first term negative
         
-        poly = self[:]
-        poly.reverse()
-        
         response = ''
         
-        for order in range(len(self) - 1, -1, -1): 
+        last = len(self) - 1
+        
+        for i in range(len(self)):
             
-            coefficient = poly.pop()
+            order = last - i
+            coefficient = self[i]
             
             if coefficient == 0:
                 continue
             
-            if order != (len(self) - 1):
+            if order != last:
             
                 if coefficient > 0:
                     response += ' + '
                 else:
                     response += ' - '
             
-            if coefficient < 0 and order == (len(self) - 1):
+            if coefficient < 0 and order == last:
                 response += '-'
             
             if abs(coefficient) != 1 or order == 0:
-                response += str(abs(coefficient))
+                response += _format(abs(coefficient))
             
             if order > 0:
                 response += self.var
@@ -105,28 +224,18 @@ class Polynomial(list):
         if not isinstance(term, Polynomial):
             raise ControlSystemsError('Operands must be polynomials')
         
-        a = self[:]
-        a.reverse()
-        
-        b = term[:]
-        b.reverse()
-        
-        order = (len(a) > len(b)) and len(a) or len(b)
-        result = [0 for x in range(order)]
+        if len(self) >= len(term):
+            longer, shorter = self, term
+        else:
+            longer, shorter = term, self
         
-        for x in range(order):
-            try:
-                result[x] += a[x]
-            except IndexError:
-                pass
-            try:
-                result[x] += b[x]
-            except IndexError:
-                pass
+        result = Polynomial(longer)
+        offset = len(longer) - len(shorter)
         
-        result.reverse()
+        for i in range(len(shorter)):
+            result[offset + i] += shorter[i]
         
-        return Polynomial(result)
+        return result
 
 
     def __sub__(self, term):
@@ -148,9 +257,7 @@ class Polynomial(list):
         
         """
         
-        term_aux = Polynomial([-x for x in term])
-        
-        return self.__add__(term_aux)
+        return self.__add__(term.mult(-1))
     
     
     def __mul__(self, term):
@@ -168,36 +275,38 @@ class Polynomial(list):
             >>> type(c)
             <class 'pidsim.types.Polynomial'>
         
+        The coefficients are the direct convolution of the coefficients
+        of the operands. If both operands have at least 'fft_threshold'
+        coefficients, the convolution is computed by FFT instead, with
+        float results. The error of the FFT is relative to the largest
+        coefficient, then it's only used if the ratio between the largest
+        and the smallest nonzero coefficients of both operands is lower
+        than 'fft_dynamic_range' (it isn't for products like (s + 1)^n).
+        
         """
         
         if not isinstance(term, Polynomial):
             raise ControlSystemsError('Operands must be polynomials')
         
-        a = self[:]
-        b = term[:]
-        result = []
-        j = 0
-        
-        for x in a:
-            i = 0
-            for y in b:
-                result.append((i + j, x * y))
-                i += 1
-            j += 1
+        a = self.tolist()
+        b = term.tolist()
         
-        ord_res = 0
+        if len(a) == 0 or len(b) == 0:
+            return Polynomial([0])
         
-        for x, y in result:
-            if x > ord_res:
-                ord_res = x
+        if min(len(a), len(b)) >= self.fft_threshold and \
+           max(_dynamic_range(a), _dynamic_range(b)) < \
+           self.fft_dynamic_range:
+            return Polynomial(_fft_convolve(a, b))
         
-        resp = [0 for x in range(ord_res + 1)]
+        resp = [0.0] * (len(a) + len(b) - 1)
         
-        for x in range(ord_res + 1):
-            resp[x] = 0
-            for c, d in result:
-                if c == x:
-                    resp[x] += d
+        for i in range(len(a)):
+            x = a[i]
+            if x == 0:
+                continue
+            for j in range(len(b)):
+                resp[i + j] += x * b[j]
         
         return Polynomial(resp)
 
@@ -205,25 +314,177 @@ class Polynomial(list):
     def __div__(self, term):
         """Operation of division of polynomials
         
-        This method returns a Polynomial object with the result of the
-        multiplication of the Polynomial 'self' and the Polynomial
-        'term'.
+        This method returns a Polynomial object with the quotient of the
+        division of the Polynomial 'self' by the Polynomial 'term'. For
+        example::
         
-        Not implemented yet.
+            >>> a = Polynomial([1, 3, 2])
+            >>> b = Polynomial([1, 1])
+            >>> c = a / b
+            >>> print c
+            x + 2
+            >>> type(c)
+            <class 'pidsim.types.Polynomial'>
         
         """
         
-        #TODO: implement division of polynomials
-        
         if not isinstance(term, Polynomial):
             raise ControlSystemsError('Operands must be polynomials')
         
         if len(term) > len(self):
             raise ControlSystemsError('Invalid sizes to division')
         
-        raise NotImplementedError
-
+        return self.__divmod__(term)[0]
+    
+    __truediv__ = __div__
+    
+    
+    def __mod__(self, term):
+        """Remainder of the division of polynomials
+        
+        This method returns a Polynomial object with the remainder of the
+        division of the Polynomial 'self' by the Polynomial 'term'. For
+        example::
+        
+            >>> a = Polynomial([1, 3, 3])
+            >>> b = Polynomial([1, 1])
+            >>> c = a % b
+            >>> print c
+            1
+        
+        """
+        
+        return self.__divmod__(term)[1]
+    
+    
+    def __divmod__(self, term):
+        """Long division of polynomials
+        
+        This method returns a tuple of Polynomial objects with the
+        quotient and the remainder of the division of the Polynomial
+        'self' by the Polynomial 'term'. The remainder has the size of
+        'term' minus one.
+        
+        """
+        
+        if not isinstance(term, Polynomial):
+            raise ControlSystemsError('Operands must be polynomials')
+        
+        divisor = term.strip().tolist()
+        
+        if len(divisor) == 0:
+            raise ControlSystemsError('Division by zero polynomial')
+        
+        rem = self.tolist()
+        size = len(rem) - len(divisor) + 1
+        
+        if size <= 0:
+            return Polynomial([0]), Polynomial(rem)
+        
+        quot = [0.0] * size
+        
+        for i in range(size):
+            coef = rem[i] / float(divisor[0])
+            quot[i] = coef
+            if coef == 0:
+                continue
+            for j in range(1, len(divisor)):
+                rem[i + j] -= coef * divisor[j]
+        
+        rem = rem[size:] or [0]
+        
+        return Polynomial(quot), Polynomial(rem)
+    
+    
+    def strip(self, tolerance=0.0):
+        """Removal of leading zeros
+        
+        This method returns a Polynomial object without the leading
+        coefficients whose absolute values are lower than or equal to
+        'tolerance'. For example::
+        
+            >>> a = Polynomial([0, 0, 1, 2])
+            >>> print repr(a.strip())
+            Polynomial([1.0, 2.0])
+        
+        """
+        
+        for i in range(len(self)):
+            if abs(self[i]) > tolerance:
+                return Polynomial(self[i:])
+        
+        return Polynomial()
+    
+    
+    def roots(self):
+        """Roots of polynomials
         
+        This method returns a list with the complex roots of the
+        Polynomial 'self'. The roots are the eigenvalues of the companion
+        matrix, computed by NumPy if available, or by the Durand-Kerner
+        method otherwise. For example::
+        
+            >>> a = Polynomial([1, 3, 2])
+            >>> a.roots()
+            [(-2+0j), (-1+0j)]
+        
+        """
+        
+        coefs = self.strip().tolist()
+        
+        # exact roots at zero
+        zeros = 0
+        while len(coefs) > 1 and coefs[-1] == 0:
+            coefs.pop()
+            zeros += 1
+        
+        if len(coefs) < 2:
+            return [0j] * zeros
+        
+        if numpy is not None:
+            roots = [complex(x) for x in numpy.roots(coefs)]
+        else:
+            roots = _durand_kerner(coefs)
+        
+        return sorted(roots, key=lambda x: (x.real, x.imag)) + [0j] * zeros
+    
+    
+    def gcd(self, term, tolerance=1e-4):
+        """Greatest common divisor of polynomials
+        
+        This method returns a monic Polynomial object with the greatest
+        common divisor of the Polynomial 'self' and the Polynomial
+        'term', built from the common roots of both polynomials (see
+        Polynomial.roots). Roots whose distance is lower than 'tolerance'
+        times the largest of 1 and their absolute value are taken as
+        equal, then common factors are found even with rounding errors.
+        For example::
+        
+            >>> a = Polynomial([1, 3, 2]) # (x + 1)*(x + 2)
+            >>> b = Polynomial([1, 4, 3]) # (x + 1)*(x + 3)
+            >>> print a.gcd(b)
+            x + 1
+        
+        """
+        
+        if not isinstance(term, Polynomial):
+            raise ControlSystemsError('Operands must be polynomials')
+        
+        a = self.strip()
+        b = term.strip()
+        
+        if len(a) == 0 and len(b) == 0:
+            raise ControlSystemsError('GCD of zero polynomials')
+        
+        if len(a) == 0 or len(b) == 0:
+            c = len(a) and a or b
+            return c.mult(1.0 / c[0])
+        
+        common = _common_factors(a, b, tolerance)
+        
+        return _from_factors(common)
+    
+    
     def mult(self, val):
         """Operation of multiplication between numbers and polynomials
         
@@ -242,12 +503,7 @@ class Polynomial(list):
         
         #TODO: check if 'val' is a Real number
         
-        x = []
-        
-        for i in range(len(self)):
-            x.append(self[i] * val)
-        
-        return Polynomial(x)
+        return Polynomial([x * val for x in self])
     
     
     def Zero(self, order):
@@ -258,21 +514,139 @@ class Polynomial(list):
         
             >>> a = Polynomial()
             >>> a.Zero(4)
-            [0, 0, 0, 0]
+            Polynomial([0.0, 0.0, 0.0, 0.0])
         
         """
         
-        #TODO: implement it in a better way
-        
-        zero = []
-        
-        for i in range(order):
-            zero.append(0)
-        
-        return Polynomial(zero)
+        return Polynomial(array('d', [0.0]) * order)
 poly = Polynomial
 
 
+def _format(number):
+    """Returns the string representation of 'number', without the
+    decimal part if 'number' is integral"""
+    
+    if isinstance(number, float) and number.is_integer():
+        return str(int(number))
+    
+    return str(number)
+
+
+def _fft(values, invert=False):
+    """Fast Fourier Transform
+    
+    Returns the (inverse, if 'invert') discrete Fourier transform of the
+    list 'values', whose size must be a power of 2, using the iterative
+    radix-2 Cooley-Tukey algorithm. The inverse isn't scaled.
+    
+    """
+    
+    n = len(values)
+    res = list(values)
+    
+    # bit-reversal permutation
+    j = 0
+    for i in range(1, n):
+        bit = n >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j:
+            res[i], res[j] = res[j], res[i]
+    
+    size = 2
+    while size <= n:
+        angle = (invert and 2 or -2) * cmath.pi / size
+        half = size // 2
+        twiddles = [cmath.exp(1j * angle * k) for k in range(half)]
+        for start in range(0, n, size):
+            for k in range(half):
+                u = res[start + k]
+                v = res[start + k + half] * twiddles[k]
+                res[start + k] = u + v
+                res[start + k + half] = u - v
+        size *= 2
+    
+    return res
+
+
+def _durand_kerner(coefs, iterations=500):
+    """Roots of polynomials by the Durand-Kerner method
+    
+    Returns the list of the complex roots of the polynomial with the
+    coefficients 'coefs' (a list, with nonzero leading coefficient).
+    
+    """
+    
+    n = len(coefs) - 1
+    monic = [complex(x) / coefs[0] for x in coefs]
+    
+    # initial guesses on a circle containing all the roots
+    radius = 1 + max([abs(x) for x in monic[1:]])
+    roots = [radius * (0.4 + 0.9j) ** k for k in range(n)]
+    
+    # the approximations of multiple roots don't converge, but wander
+    # around them, then the iterate with the smallest update is kept
+    best = roots
+    best_size = None
+    
+    for iteration in range(iterations):
+        # simultaneous (Jacobi) updates keep the sum of the roots
+        deltas = []
+        for i in range(n):
+            value = 0j
+            for x in monic:
+                value = value * roots[i] + x
+            den = 1 + 0j
+            for j in range(n):
+                if i != j:
+                    den *= roots[i] - roots[j]
+            if den == 0:
+                den = 1e-300
+            deltas.append(value / den)
+        roots = [x - delta for x, delta in zip(roots, deltas)]
+        size = max([abs(delta) for delta in deltas])
+        if best_size is None or size <= best_size:
+            best, best_size = roots, size
+        if size <= 1e-15 * radius:
+            break
+    
+    return best
+
+
+def _dynamic_range(values):
+    """Returns the ratio between the largest and the smallest nonzero
+    absolute values of the list 'values'"""
+    
+    values = [abs(x) for x in values if x != 0]
+    if not values:
+        return 1.0
+    
+    return max(values) / min(values)
+
+
+def _fft_convolve(a, b):
+    """Convolution by FFT
+    
+    Returns the list with the convolution of the lists 'a' and 'b',
+    computed by FFT.
+    
+    """
+    
+    size = len(a) + len(b) - 1
+    n = 1
+    while n < size:
+        n *= 2
+    
+    fa = _fft(a + [0] * (n - len(a)))
+    fb = _fft(b + [0] * (n - len(b)))
+    
+    res = _fft([x * y for x, y in zip(fa, fb)], invert=True)
+    
+    return [x.real / n for x in res[:size]]
+
+
 class Matrix(list):
     """Matrix type
     
@@ -403,6 +777,10 @@ class Matrix(list):
         if not isinstance(mat, Matrix):
             raise ControlSystemsError('Operands must be matrices')
         
+        if self.rows == mat.rows and self.cols == mat.cols:
+            return Matrix([[x + y for x, y in zip(a, b)] \
+                           for a, b in zip(self, mat)])
+        
         rows = self.rows > mat.rows and self.rows or mat.rows
         cols = self.cols > mat.cols and self.cols or mat.cols
         
@@ -489,14 +867,10 @@ class Matrix(list):
         if self.cols != mat.rows:
             raise ControlSystemsError('Invalid Matrices size for mult.')
         
-        res = ZerosMatrix(self.rows, mat.cols)
-        
-        for i in range(self.rows):
-            for j in range(mat.cols):
-                for aux in range(self.cols):
-                    res[i][j] += self[i][aux] * mat[aux][j]
+        cols = zip(*mat)
         
-        return res
+        return Matrix([[sum([x * y for x, y in zip(row, col)]) \
+                        for col in cols] for row in self])
 
 
     def mult(self, num):
@@ -559,6 +933,85 @@ class Matrix(list):
                 aux[j][i] = self[i][j]
         
         return aux
+    
+    
+    def expm(self):
+        """Matrix exponential
+        
+        This method returns a Matrix object with the exponential of the
+        square Matrix 'self', computed by scaling and squaring: the
+        matrix is scaled by a power of 2 until its norm is lower than
+        0.5, the exponential of the scaled matrix is computed by its
+        Taylor series, and the result is squared back. For example::
+        
+            >>> a = Matrix([
+            ...     [0, 1],
+            ...     [0, 0],
+            ... ])
+            >>>
+            >>> b = a.expm()
+            >>> print b
+            1.0    1.0
+            0.0    1.0
+            >>>
+            >>> type(b)
+            <class 'pidsim.types.Matrix'>
+        
+        """
+        
+        if self.rows != self.cols:
+            raise ControlSystemsError('Matrix must be square')
+        
+        norm = max([sum([abs(x) for x in row]) for row in self] + [0])
+        
+        squarings = 0
+        while norm > 0.5:
+            norm /= 2.0
+            squarings += 1
+        
+        scaled = self.mult(1.0 / 2 ** squarings)
+        
+        res = IdentityMatrix(self.rows).mult(1.0)
+        term = res
+        
+        for k in range(1, 30):
+            term = (term * scaled).mult(1.0 / k)
+            res = res + term
+            if max([abs(x) for row in term for x in row] + [0]) < 1e-18:
+                break
+        
+        for i in range(squarings):
+            res = res * res
+        
+        return res
+    
+    
+    def array(self):
+        """Array representation
+        
+        This method returns the matrix as a contiguous NumPy array of
+        float64 values, to be used by the vectorized numerical methods.
+        For example::
+        
+            >>> a = Matrix([
+            ...     [1, 2],
+            ...     [3, 4],
+            ... ])
+            >>>
+            >>> b = a.array()
+            >>> b.dtype
+            dtype('float64')
+        
+        NumPy is an optional dependency. This method raises a
+        ControlSystemsError if it isn't available.
+        
+        """
+        
+        if numpy is None:
+            raise ControlSystemsError('NumPy is required for arrays')
+        
+        return numpy.array(self, dtype=numpy.float64).reshape(self.rows,
+                                                              self.cols)
 mat = Matrix
 
 
@@ -603,14 +1056,14 @@ def ZerosPolynomial(order):
     
         >>> a = ZerosPolynomial(3)
         >>> print list(a)
-        [0, 0, 0, 0]
+        [0.0, 0.0, 0.0, 0.0]
         >>>
         >>> type(a)
         <class 'pidsim.types.Polynomial'>
     
     """
     
-    return Polynomial([0 for i in range(order + 1)])
+    return Polynomial(array('d', [0.0]) * (order + 1))
 
 
 def IdentityMatrix(order):
@@ -645,6 +1098,155 @@ def IdentityMatrix(order):
 eye = IdentityMatrix
 
 
+# relative spread of the computed roots of a multiple root is about
+# epsilon ** (1 / multiplicity)
+_epsilon = 2.0 ** -52
+
+
+def _factors(roots, tolerance):
+    """Factors of polynomials
+    
+    Returns the list of the factors [root, multiplicity] of the roots
+    'roots' of a real polynomial. The computed roots of a root of
+    multiplicity k spread around it, by about epsilon ** (1/k)
+    (relative to the largest of 1 and its absolute value), then groups
+    of k roots inside that spread, and isolated from the other roots,
+    are taken as a multiple root, at their mean. The factors have real
+    roots (floats), or complex roots with positive imaginary part, that
+    stand for the pair of conjugate roots. Returns None if the roots
+    aren't symmetric.
+    
+    """
+    
+    clusters = []
+    remaining = list(roots)
+    while remaining:
+        seed = remaining[0]
+        others = sorted(remaining, key=lambda x: abs(x - seed))
+        
+        # groups spread by 0.25 at most, then farther roots aren't tried
+        size = len(others)
+        while size > 1 and abs(others[size-1] - seed) > max(1.0, abs(seed)):
+            size -= 1
+        
+        for k in range(size, 1, -1):
+            center = sum(others[:k]) / k
+            spread = max([abs(x - center) for x in others[:k]])
+            gap = min([abs(x - center) for x in others[k:]] or [float('inf')])
+            limit = min(0.25, 20 * _epsilon ** (1.0 / k))
+            if spread <= limit * max(1.0, abs(center)) and gap > 2 * spread:
+                break
+        else:
+            k = 1
+        
+        clusters.append(others[:k])
+        remaining = others[k:]
+    
+    factors = []
+    degree = 0
+    for cluster in clusters:
+        center = sum(cluster) / len(cluster)
+        if abs(center.imag) <= tolerance * max(1.0, abs(center)):
+            factors.append([center.real, len(cluster)])
+            degree += len(cluster)
+        elif center.imag > 0:
+            factors.append([center, len(cluster)])
+            degree += 2 * len(cluster)
+    
+    if degree != len(roots):
+        return None
+    
+    return factors
+
+
+def _from_factors(factors):
+    """Returns the monic Polynomial object with the factors 'factors'
+    (see _factors)"""
+    
+    poly = Polynomial([1])
+    for root, multiplicity in factors:
+        if isinstance(root, complex):
+            term = Polynomial([1, -2 * root.real, abs(root) ** 2])
+        else:
+            term = Polynomial([1, -root])
+        for i in range(multiplicity):
+            poly = poly * term
+    return poly
+
+
+def _common_factors(a, b, tolerance):
+    """Common factors of polynomials
+    
+    Returns the list of factors (see _factors) common to the Polynomial
+    objects 'a' and 'b'. Nothing is common if the roots of 'a' or 'b'
+    can't be grouped.
+    
+    """
+    
+    factors_a = _factors(a.roots(), tolerance)
+    factors_b = _factors(b.roots(), tolerance)
+    
+    if factors_a is None or factors_b is None:
+        return []
+    
+    common = []
+    for fa in factors_a:
+        for fb in factors_b:
+            if fb[1] == 0 or isinstance(fa[0], complex) != \
+               isinstance(fb[0], complex):
+                continue
+            if abs(fa[0] - fb[0]) <= tolerance * max(1.0, abs(fa[0])):
+                multiplicity = min(fa[1], fb[1])
+                common.append([(fa[0] + fb[0]) / 2, multiplicity])
+                fa[1] -= multiplicity
+                fb[1] -= multiplicity
+                break
+    
+    return common
+
+
+def _divide(a, factors):
+    """Returns the quotient of the division of the Polynomial 'a' by the
+    factors 'factors' (see _factors). Each factor is divided from the
+    highest power if its roots are inside the unit circle, and from the
+    lowest power otherwise, that keeps the division stable."""
+    
+    for root, multiplicity in factors:
+        term = _from_factors([[root, 1]])
+        for i in range(multiplicity):
+            if abs(root) <= 1:
+                a = divmod(a, term)[0]
+            else:
+                quot = divmod(Polynomial(a.tolist()[::-1]),
+                              Polynomial(term.tolist()[::-1]))[0]
+                a = Polynomial(quot.tolist()[::-1])
+    return a
+
+
+def _cancel(a, b, tolerance=1e-4):
+    """Cancellation of common factors
+    
+    Returns the Polynomial objects 'a' and 'b' divided by their common
+    factors (see Polynomial.gcd), or 'a' and 'b' themselves if they
+    don't have common factors. The remaining roots are kept, even if
+    they're close to each other.
+    
+    """
+    
+    a = a.strip()
+    b = b.strip()
+    
+    if len(a) < 2 or len(b) < 2:
+        return a, b
+    
+    common = _common_factors(a, b, tolerance)
+    
+    if not common:
+        return a, b
+    
+    return _divide(a, common), _divide(b, common)
+
+
 class TransferFunction(object):
     """TransferFunction type
     
@@ -676,6 +1278,41 @@ class TransferFunction(object):
         self.den.var = 's'
     
     
+    def __eq__(self, tf):
+        """Equality of the coefficients of transfer functions"""
+        
+        if not isinstance(tf, TransferFunction):
+            return False
+        
+        return self.key() == tf.key()
+    
+    
+    def __ne__(self, tf):
+        return not self.__eq__(tf)
+    
+    
+    # the polynomials are mutable, then transfer functions aren't
+    # hashable (see key)
+    __hash__ = None
+    
+    
+    def key(self):
+        """Immutable snapshot
+        
+        This method returns a tuple with the coefficients of the numerator
+        and of the denominator, hashable and equal for equal transfer
+        functions, to be used as a key of dicts and caches instead of the
+        TransferFunction itself (see Polynomial.key). For example::
+        
+            >>> a = TransferFunction([1], [1, 2, 3])
+            >>> a.key()
+            ((1.0,), (1.0, 2.0, 3.0))
+        
+        """
+        
+        return self.num.key(), self.den.key()
+    
+    
     def __str__(self):
         """String representation
         
@@ -721,11 +1358,12 @@ class TransferFunction(object):
             >>> type(c)
             <class 'pidsim.types.TransferFunction'>
         
+        The denominator is the least common multiple of the denominators
+        (see TransferFunction.parallel).
+        
         """
         
-        num = (self.num*tf.den) + (tf.num*self.den)
-        den = self.den * tf.den
-        return TransferFunction(num, den)
+        return self.parallel(tf)
     
     
     def __sub__(self, tf):
@@ -750,10 +1388,7 @@ class TransferFunction(object):
         
         """
         
-        num = (self.num*tf.den) - (tf.num*self.den)
-        den = self.den * tf.den
-        
-        return TransferFunction(num, den)
+        return self.parallel(TransferFunction(tf.num.mult(-1), tf.den))
 
 
     def __mul__(self, tf):
@@ -809,41 +1444,30 @@ class TransferFunction(object):
             >>> type(b)
             <class 'pidsim.types.TransferFunction'>
         
-        .. warning::
+        The common factors of the numerator and the denominator are
+        cancelled (see Polynomial.gcd), and the denominator is made
+        monic. For example::
+        
+            >>> a = TransferFunction([1, 1], [1, 3, 2])
+            >>> print a.simplify()
+            Transfer Function:
+            
+              1  
+            -----
+            s + 2
             
-            This method is far from perfect, and don't simplify all
-            possible expressions, but it's usable.
         
         """
         
-        #TODO: improve this method
-        
-        num = self.num[:]
-        den = self.den[:]
+        num = self.num.strip()
+        den = self.den.strip()
         
-        mdc = 1
+        if len(num) == 0:
+            return TransferFunction([0], [1])
         
-        for i in range(1, int(max([max(num), max(den)]))):
-            
-            die = 0
-            
-            if len(self.num) == 1:
-                mdc = self.num[0]
-            
-            else:
-                
-                for j in range(len(num)):
-                    if num[j] % i != 0:
-                        die = 1
-                
-                for j in range(len(den)):
-                    if den[j] % i != 0:
-                        die = 1
-                
-                if not die:
-                    mdc = i
+        num, den = _cancel(num, den)
         
-        return TransferFunction(num, den).div(mdc)
+        return TransferFunction(num, den).div(den[0])
 
 
     def mult(self, a):
@@ -913,34 +1537,129 @@ class TransferFunction(object):
         return TransferFunction(num, den)
 
 
+    def series(self, tf):
+        """Series interconnection
+        
+        This method returns a TransferFunction object with the series
+        interconnection of the TransferFunction 'self' and the
+        TransferFunction 'tf'. Unlike the multiplication, the common
+        factors of each numerator and the other denominator are
+        cancelled. For example::
+        
+            >>> a = TransferFunction([1, 1], [1, 2, 3])
+            >>> b = TransferFunction([1], [1, 4, 3])
+            >>> c = a.series(b)
+            >>> print c
+            Transfer Function:
+            
+                     1         
+            -------------------
+            s^3 + 5s^2 + 9s + 9
+            
+            >>> type(c)
+            <class 'pidsim.types.TransferFunction'>
+        
+        """
+        
+        num1, den2 = _cancel(self.num, tf.den)
+        num2, den1 = _cancel(tf.num, self.den)
+        
+        return TransferFunction(num1 * num2, den1 * den2)
+    
+    
+    def parallel(self, tf):
+        """Parallel interconnection
+        
+        This method returns a TransferFunction object with the parallel
+        interconnection (the sum) of the TransferFunction 'self' and the
+        TransferFunction 'tf'. The denominator is the least common
+        multiple of the denominators, instead of their product. For
+        example::
+        
+            >>> a = TransferFunction([1], [1, 3, 2])
+            >>> b = TransferFunction([1], [1, 4, 3])
+            >>> c = a.parallel(b)
+            >>> print c
+            Transfer Function:
+            
+                   2s + 5       
+            --------------------
+            s^3 + 6s^2 + 11s + 6
+            
+            >>> type(c)
+            <class 'pidsim.types.TransferFunction'>
+        
+        """
+        
+        den1, den2 = _cancel(self.den, tf.den)
+        
+        num = ((self.num * den2) + (tf.num * den1)).strip()
+        den = self.den * den2
+        
+        if len(num) == 0:
+            num = [0]
+        
+        return TransferFunction(num, den)
+    
+    
+    def feedback(self, h=None, sign=-1):
+        """Feedback
+        
+        This method returns a TransferFunction object with the result
+        of the feedback of the transfer function with the transfer
+        function 'h' on the feedback path (unit gain, if None), i.e.
+        G/(1 - sign*G*H). It's computed directly from the polynomials::
+        
+            Ng*Dh / (Dg*Dh - sign*Ng*Nh)
+        
+        then the order of the result is the sum of the orders of 'self'
+        and 'h'. For example::
+        
+            >>> a = TransferFunction([1], [1, 2, 3])
+            >>> b = a.feedback(TransferFunction([2], [1]))
+            >>> print b
+            Transfer Function:
+            
+                 1      
+            ------------
+            s^2 + 2s + 5
+            
+            >>> type(b)
+            <class 'pidsim.types.TransferFunction'>
+        
+        """
+        
+        if h is None:
+            h = TransferFunction([1], [1])
+        
+        num = self.num * h.den
+        den = (self.den * h.den) - (self.num * h.num).mult(sign)
+        
+        return TransferFunction(num, den)
+    
+    
     def feedback_unit(self):
         """Feedback with unit gain
         
         This method returns a TransferFunction object with the result
-        of the unit gain feedback of the transfer function. For example::
+        of the unit gain feedback of the transfer function, N/(D + N),
+        with the same order of the transfer function. For example::
         
             >>> a = TransferFunction([1], [1, 2, 3])
             >>> b = a.feedback_unit()
             >>> print b
             Transfer Function:
             
-                     s^2 + 2s + 3        
-            -----------------------------
-            s^4 + 4s^3 + 11s^2 + 14s + 12
+                 1      
+            ------------
+            s^2 + 2s + 4
             
             >>> type(b)
             <class 'pidsim.types.TransferFunction'>
         
-        Attention: This method is far from perfect, and don't simplify
-        the expressions, but it's usable.
-        
         """
         
-        #TODO: improve this method
-        
-        aux = TransferFunction([1], [1]) + self
-        
-        return TransferFunction(self.num * aux.den, self.den * aux.num)
+        return TransferFunction(self.num, self.den + self.num)
 tf = TransferFunction
 
 
@@ -1021,8 +1740,8 @@ class StateSpace(object):
         if len(tf.num) == 0 or len(tf.den) == 0:
             raise ControlSystemsError('Invalid Transfer Function')
         
-        num = tf.num[:]
-        den = tf.den[:]
+        num = list(tf.num)
+        den = list(tf.den)
         nn = len(num)
         nd = len(den)
         
@@ -1063,7 +1782,7 @@ class StateSpace(object):
             b[nd-2][0] = 1
             
             # Form the C matrix
-            c = Polynomial(num[1:]) - den.mult(num[0])
+            c = list(Polynomial(num[1:]) - den.mult(num[0]))
             c.reverse()
             c = [c]
             
@@ -1107,4 +1826,240 @@ class StateSpace(object):
         ret += str(self.d) + '\n'
         
         return ret
+    
+    
+    def arrays(self):
+        """Array representation
+        
+        This method returns the matrices A, B, C and D as NumPy arrays of
+        float64 values. See Matrix.array() for details.
+        
+        """
+        
+        return self.a.array(), self.b.array(), self.c.array(), \
+               self.d.array()
 ss = StateSpace
+
+
+class TimeAxis(object):
+    """TimeAxis type
+    
+    This class implements a read-only sequence of 'count' equally spaced
+    times, starting at 'start' with the step 'step'. The times are
+    computed on demand, then the time axis of a simulation costs the
+    same memory for any number of samples. For example::
+    
+        >>> t = TimeAxis(0.0, 0.5, 5)
+        >>> list(t)
+        [0.0, 0.5, 1.0, 1.5, 2.0]
+        >>> t[-1]
+        2.0
+        >>> t[1:4]
+        TimeAxis(0.5, 0.5, 3)
+    
+    """
+    
+    __slots__ = ('start', 'step', 'count')
+    
+    def __init__(self, start, step, count):
+        """Initialization of TimeAxis object"""
+        
+        self.start = float(start)
+        self.step = float(step)
+        self.count = int(count)
+    
+    
+    def __reduce__(self):
+        """Pickle support"""
+        
+        return self.__class__, (self.start, self.step, self.count)
+    
+    
+    def __repr__(self):
+        """Representation of TimeAxis object"""
+        
+        return 'TimeAxis(%r, %r, %r)' % (self.start, self.step, self.count)
+    
+    
+    def __len__(self):
+        return self.count
+    
+    
+    def __getitem__(self, key):
+        """Time of the sample 'key', or TimeAxis of a slice of samples"""
+        
+        if isinstance(key, slice):
+            first, last, stride = key.indices(self.count)
+            count = len(xrange(first, last, stride))
+            return TimeAxis(self.start + self.step * first,
+                            self.step * stride, count)
+        
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError('TimeAxis index out of range')
+        
+        return self.start + self.step * key
+    
+    
+    def __iter__(self):
+        start, step = self.start, self.step
+        for i in xrange(self.count):
+            yield start + step * i
+    
+    
+    def __eq__(self, other):
+        """Equality with time axes and other sequences of numbers"""
+        
+        if isinstance(other, TimeAxis):
+            return (self.start, self.step, self.count) == \
+                   (other.start, other.step, other.count)
+        
+        try:
+            return len(self) == len(other) and \
+                   all([x == y for x, y in zip(self, other)])
+        except TypeError:
+            return False
+    
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    
+    __hash__ = None
+    
+    
+    def tolist(self):
+        """Returns the times as a list of floats"""
+        
+        return list(self)
+    
+    
+    def array(self):
+        """Array representation
+        
+        This method returns the times as a NumPy array of float64
+        values. NumPy is required.
+        
+        """
+        
+        if numpy is None:
+            raise ControlSystemsError('NumPy not available')
+        
+        return self.start + self.step * numpy.arange(self.count,
+                                                     dtype=numpy.float64)
+
+
+class SimulationResult(object):
+    """SimulationResult type
+    
+    This class implements the result of a simulation: the time axis 't'
+    (a TimeAxis object) and the output 'y', stored in a contiguous
+    array('d') buffer of C doubles. For example::
+    
+        >>> g = TransferFunction([1], [1, 2, 3])
+        >>> result = RungeKutta4(g, 0.01, 10)
+        >>> result.t
+        TimeAxis(0.0, 0.01, 1001)
+        >>> result.y
+        array('d', [...])
+    
+    For backward compatibility with the tuples (t, y) returned by the
+    older versions, a SimulationResult can be unpacked and indexed like
+    a tuple of 2 items::
+    
+        >>> t, y = RungeKutta4(g, 0.01, 10)
+        >>> result[1] is result.y
+        True
+    
+    Slicing selects samples, returning a new SimulationResult::
+    
+        >>> result[100:200]
+        (returns the samples from 1 to 2 seconds)
+    
+    The buffer of 'y' is exported without copies by the method buffer()
+    (buffer protocol) and by array() (NumPy arrays).
+    
+    """
+    
+    __slots__ = ('t', 'y')
+    
+    def __init__(self, y, sample_time, start=0.0):
+        """Initialization of SimulationResult object
+        
+        This method initialize a SimulationResult object with the points
+        'y' (any iterable of numbers), sampled each 'sample_time' seconds
+        from the time 'start'.
+        
+        """
+        
+        if not isinstance(y, array) or y.typecode != 'd':
+            y = array('d', y)
+        
+        self.y = y
+        self.t = TimeAxis(start, sample_time, len(y))
+    
+    
+    def __reduce__(self):
+        """Pickle support"""
+        
+        return self.__class__, (self.y, self.t.step, self.t.start)
+    
+    
+    def __repr__(self):
+        """Representation of SimulationResult object"""
+        
+        return '<SimulationResult: %i samples, %r>' % (len(self.y), self.t)
+    
+    
+    def __len__(self):
+        """Length of the tuple (t, y)"""
+        
+        return 2
+    
+    
+    def __iter__(self):
+        """Unpacking as the tuple (t, y)"""
+        
+        yield self.t
+        yield self.y
+    
+    
+    def __getitem__(self, key):
+        """Item of the tuple (t, y), or SimulationResult of a slice of
+        samples"""
+        
+        if isinstance(key, slice):
+            t = self.t[key]
+            return SimulationResult(self.y[key], t.step, t.start)
+        
+        return (self.t, self.y)[key]
+    
+    
+    @property
+    def samples(self):
+        """Number of samples"""
+        
+        return len(self.y)
+    
+    
+    def buffer(self):
+        """Returns a read-only buffer with the points of 'y', as C
+        doubles, sharing the memory of 'y'"""
+        
+        return buffer(self.y)
+    
+    
+    def array(self):
+        """Array representation
+        
+        This method returns the tuple (t, y) of NumPy arrays of float64
+        values. The array 'y' shares the memory of 'y'. NumPy is
+        required.
+        
+        """
+        
+        if numpy is None:
+            raise ControlSystemsError('NumPy not available')
+        
+        return self.t.array(), numpy.frombuffer(self.y, dtype=numpy.float64)
@@ -18,8 +18,12 @@ setup(
         'pidsim',
 	'pidsim.core',
         'pidsim.core.pid',
+        'pidsim.bench',
     ],
     namespace_packages = ['pidsim'],
+    extras_require = {
+        'numpy': ['numpy'],
+    },
     zip_safe = False,
     classifiers=[
         'Development Status :: 4 - Beta',